@@ -0,0 +1,99 @@
+import argparse
+import time
+import cv2
+import numpy as np
+import config
+from subsystems.detectors import create_detector
+
+# 用法:
+#   python benchmark_detector.py clip.mp4
+#   python benchmark_detector.py clip.mp4 opencv:640 onnxruntime:640 onnxruntime:320:/path/yolov8n_320_int8.onnx
+# 每个后端写成 "后端:输入尺寸[:模型路径]"；第一个作为参考 (召回率的"真值")
+
+def parse_spec(spec):
+    parts = spec.split(":", 2)
+    backend = parts[0]
+    size = int(parts[1]) if len(parts) > 1 else config.DETECTOR_INPUT_SIZE
+    model = parts[2] if len(parts) > 2 else config.DETECTOR_MODEL
+    return backend, size, model
+
+def load_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret: break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def iou(a, b):
+    x1, y1 = max(a["x"], b["x"]), max(a["y"], b["y"])
+    x2 = min(a["x"] + a["w"], b["x"] + b["w"])
+    y2 = min(a["y"] + a["h"], b["y"] + b["h"])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = a["w"] * a["h"] + b["w"] * b["h"] - inter
+    return inter / union if union > 0 else 0.0
+
+def matched(reference, detections, threshold=0.5):
+    """参考框中被 IoU >= threshold 命中的个数 (贪心一对一匹配)"""
+    used = set()
+    hits = 0
+    for ref in reference:
+        best, best_iou = None, threshold
+        for i, det in enumerate(detections):
+            if i in used: continue
+            score = iou(ref, det)
+            if score >= best_iou: best, best_iou = i, score
+        if best is not None:
+            used.add(best); hits += 1
+    return hits
+
+def run(detector, frames, warmup=5):
+    for frame in frames[:warmup]: detector.detect(frame)
+    results, latencies = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        results.append(detector.detect(frame))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="检测后端延迟 / 召回率对比")
+    parser.add_argument("clip", help="录制的视频文件")
+    parser.add_argument("backends", nargs="*", default=[f"{config.DETECTOR_BACKEND}:{config.DETECTOR_INPUT_SIZE}"])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=config.DETECTOR_THREADS)
+    args = parser.parse_args()
+
+    frames = load_frames(args.clip, args.frames)
+    if not frames:
+        print(f"❌ 无法读取视频: {args.clip}")
+        return
+    print(f"🎞️ 已载入 {len(frames)} 帧: {args.clip}")
+
+    reference = None
+    rows = []
+    for spec in args.backends:
+        backend, size, model = parse_spec(spec)
+        detector = create_detector(backend, model, size, args.threads)
+        if detector is None: continue
+        results, latencies = run(detector, frames)
+        if reference is None: reference = results
+
+        total = sum(len(r) for r in reference)
+        hits = sum(matched(ref, res) for ref, res in zip(reference, results))
+        recall = hits / total if total else float("nan")
+        seen = np.mean([len(r) > 0 for r in results])
+        rows.append((spec, latencies.mean(), np.percentile(latencies, 50), np.percentile(latencies, 95), recall, seen))
+
+    print("\n" + "=" * 78)
+    print(f"{'后端':<40} {'平均ms':>7} {'P50':>7} {'P95':>7} {'召回率':>7} {'有人帧':>7}")
+    print("-" * 78)
+    for spec, mean, p50, p95, recall, seen in rows:
+        print(f"{spec:<40} {mean:7.1f} {p50:7.1f} {p95:7.1f} {recall:7.2%} {seen:7.2%}")
+    print("=" * 78)
+    print("💡 召回率以第一个后端的检测结果为参考 (IoU >= 0.5)。")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,14 @@
 import time
 import sys
 from drivers.sts3215 import ServoDriver
+from drivers.bus import ServoBus
 import config
 
 def main():
     # 1. 连接舵机 (使用 config 中的配置)
     print(f"🔌 正在连接串口 {config.SERIAL_PORT} @ {config.BAUDRATE}...")
     try:
-        driver = ServoDriver(config.SERIAL_PORT, config.BAUDRATE)
+        driver = ServoBus(ServoDriver(config.SERIAL_PORT, config.BAUDRATE))
     except Exception as e:
         print(f"❌ 连接失败: {e}")
         return
@@ -85,6 +86,7 @@ def main():
         print(f"    {i}: {exit_pose[i]},")
     print("}")
     print("-" * 20)
+    driver.close()
 
 if __name__ == "__main__":
     main()
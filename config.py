@@ -41,16 +41,132 @@ EXIT_POSE = {
 PAN_DIR = 1    
 TILT_DIR = 1   
 PID_KP = 0.05
-DEADZONE = 5
-MAX_SPEED = 60
+PID_KI = 0.0
+PID_KD = 0.002
+DEADZONE = 5      # 像素
+MAX_SPEED = 60    # 每个控制周期最大步进 (刻度)
+
+# 视觉追踪闭环
+TRACK_RATE = 50           # 控制频率 (Hz)
+TRACK_TICKS_PER_PX = 1.0  # 画面 1 像素 ≈ 舵机刻度 (640px 视野约 60°)
+TRACK_FF = 0.5            # 目标速度前馈增益
+PAN_RANGE = (START_POSE[ID_PAN] - 1000, START_POSE[ID_PAN] + 1000)
+TILT_RANGE = (START_POSE[ID_TILT] - 400, START_POSE[ID_TILT] + 400)
+
+# 关节运动学限制 (Double-S 轨迹规划用)
+# 单位: 舵机刻度/秒、刻度/秒²、刻度/秒³ (4096 刻度 = 360°)
+JOINT_LIMITS = {
+    1: {"vmax": 1500, "amax": 6000, "jmax": 40000},  # 底座旋转 (负载最大，保守)
+    2: {"vmax": 1000, "amax": 4000, "jmax": 25000},  # 底座俯仰
+    3: {"vmax": 1200, "amax": 5000, "jmax": 30000},  # 肘部
+    4: {"vmax": 2000, "amax": 8000, "jmax": 60000},  # 手腕旋转
+    5: {"vmax": 2000, "amax": 8000, "jmax": 60000},  # 头灯俯仰
+}
 
 # 视觉参数
 CAMERA_ID = 0
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
 SEARCH_SPEED = 0.5
 SEARCH_AMP_PAN = 300
 SEARCH_AMP_TILT = 150
 SEARCH_TILT_OFFSET = -200
 IDLE_TIMEOUT = 5
+VISION_MAX_FPS = 15     # 推理频率上限
+VISION_MAX_DUTY = 0.6   # 推理线程最多占用的 CPU 时间比例 (按实测耗时自适应)
+VISION_TRACKED_FPS = 8  # 主目标被稳定跟踪时的检测频率 (两次检测之间由卡尔曼预测)
+VISION_MOTION_GATE = True       # 画面静止且没有目标时跳过 YOLO (subsystems/motion_gate.py)
+VISION_GATE_FPS = 10            # 跳过检测期间运动门控的频率 (决定有人进入时的反应时间)
+VISION_IDLE_DETECT_INTERVAL = 3.0 # 即使画面静止，也每隔这么久 (秒) 整幅检测一次
+VISION_RING_SIZE = 4    # 帧环形缓冲区槽位数 (推理 / 推流各租用一帧时仍有空槽可写)
+
+# 运动门控 (缩小灰度图与滑动平均背景做差分)
+MOTION_GATE_WIDTH = 160    # 差分用的缩小宽度
+MOTION_THRESHOLD = 18      # 灰度差超过此值算变化像素
+MOTION_MIN_AREA = 0.002    # 变化区域至少占画面的比例
+MOTION_BG_ALPHA = 0.1      # 背景更新速度 (每帧)，越大运动拖影越短
+MOTION_CROP_PAD = 0.25     # 裁剪检测时向外扩展的比例
+MOTION_CROP_MAX_AREA = 0.5 # 合并区域超过画面这一比例就直接整幅检测
+
+# 多目标跟踪 (subsystems/multi_tracker.py)
+TRACK_IOU_THRESHOLD = 0.3  # 检测框与预测框 IoU 低于此值不算同一个人
+TRACK_MIN_HITS = 2         # 连续命中几次才确认为目标 (过滤误检)
+TRACK_MAX_AGE = 1.0        # 超过这么久 (秒) 没被检测到就删除轨迹
+TRACK_MEAS_NOISE = 8.0     # 检测框位置噪声 (像素)
+TRACK_ACCEL_NOISE = 400.0  # 目标加速度噪声 (像素/秒²)
+TRACK_SIZE_NOISE = 40.0    # 框宽高变化噪声 (像素/秒)
+
+# 人形检测后端 (见 subsystems/detectors.py，可用 benchmark_detector.py 比较)
+DETECTOR_BACKEND = "opencv"   # "opencv" (OpenCV DNN) | "onnxruntime"
+DETECTOR_MODEL = "/home/scottwang/lelamp_v2/models/yolov8n.onnx" # 也可以是 INT8 量化模型
+DETECTOR_INPUT_SIZE = 640     # 须与模型导出尺寸一致，如 320 (imgsz=320 导出) 在 CPU 上约快 4 倍
+DETECTOR_THREADS = 4          # 推理线程数；opencv 后端通过 cv2.setNumThreads 设置，是进程级的，streamer / 运动门控的 cv2 调用也受限
+
+# 网页监控画面 (/video_feed?scale=&quality=&fps= 可按客户端覆盖)
+STREAM_DEFAULT_QUALITY = 60
+STREAM_DEFAULT_FPS = 25
+STREAM_MAX_ENCODE_FPS = 30    # 所有画质档位合计每秒最多编码的帧数
+STREAM_USE_TURBOJPEG = True   # 安装了 PyTurboJPEG 时使用 libjpeg-turbo 编码
+
+# 语音识别 (subsystems/ears.py)
+ASR_MODE = "streaming"        # "streaming" (sherpa-onnx 流式识别，边听边出部分结果) | "offline" (Paraformer 整句识别)
+ASR_OFFLINE_MODEL_DIR = "/home/scottwang/lelamp_v2/models/sherpa_paraformer"
+ASR_ONLINE_MODEL_DIR = "/home/scottwang/lelamp_v2/models/sherpa_streaming_zipformer" # encoder/decoder/joiner (transducer) 或 encoder/decoder (流式 paraformer)
+ASR_THREADS = 4
+ASR_MAX_UTTERANCE = 10.0      # 单句最长 (秒)
+
+# 语音活动检测 (subsystems/vad.py)，只有真正的语音片段才送进识别器
+VAD_MODEL = "/home/scottwang/lelamp_v2/models/silero_vad.onnx" # 不存在时退回能量门限
+VAD_THRESHOLD = 0.5           # Silero 语音概率阈值
+VAD_SNR = 2.0                 # 语音能量至少是底噪的几倍 (底噪持续跟踪)
+VAD_FLOOR_ADAPT = 0.02        # 底噪上升的跟踪速度 (每块)
+VAD_PRE_ROLL = 0.3            # 语音开始前补上的录音 (秒)，不丢第一个音节
+VAD_HANGOVER = 0.5            # 语音后静音多久 (秒) 算一句结束
+VAD_MIN_SPEECH = 0.25         # 短于此的语音片段 (咳嗽、敲桌子) 直接丢弃
+WAKE_WORDS = ["friday", "Friday", "管家", "星期五"] # 用语音识别匹配唤醒词时生效 (KWS 关闭或模型缺失)；流式模式下在部分结果里一出现就唤醒
+
+# 唤醒词检测 (sherpa-onnx KeywordSpotter，常驻运行，命中后才进入对话 / 整句识别)
+KWS_ENABLED = True
+KWS_MODEL_DIR = "/home/scottwang/lelamp_v2/models/sherpa_kws_zipformer_wenetspeech" # encoder/decoder/joiner + tokens.txt
+KWS_KEYWORDS = ["星期五", "管家"]  # 按 KWS_TOKENS_TYPE 自动切分成模型的 token；中文模型认不出英文 "Friday"，请说 "星期五"
+KWS_TOKENS_TYPE = "ppinyin"   # 中文 wenetspeech 模型为 ppinyin；英文 gigaspeech 模型为 bpe
+KWS_THRESHOLD = 0.25          # 触发阈值 (越小越灵敏，误触也越多)
+KWS_SCORE = 1.0               # 关键词路径加分 (越大越容易命中)
+KWS_THREADS = 1
+
+# 麦克风常驻采集 (subsystems/mic.py)
+MIC_BUFFER_SECONDS = 10       # 环形缓冲区长度；读者落后超过这么多会丢数据
+MIC_SESSION_PREROLL = 0.3     # 实时对话开始时往回补的录音 (秒)，避免丢掉唤醒后第一个音节
+MIC_SESSION_BACKLOG = 2.0     # 连接云端期间录到的声音，连上后最多补发这么多秒
+
+# 音频重采样 (subsystems/resampler.py)
+RESAMPLER_TAPS = 32           # 滤波器长度 (以低速一侧的采样周期计，每相位抽头数 = 它 × max(up, down) / up)，越长过渡带越陡、CPU 越多
+
+# 实时对话播放 (subsystems/playback.py)
+PLAYBACK_MIN_BUFFER = 0.06    # 抖动缓冲最小深度 (秒)
+PLAYBACK_MAX_BUFFER = 0.5     # 抖动缓冲目标深度上限 (秒)
+PLAYBACK_JITTER_K = 3.0       # 目标深度 = 到达间隔均值 + K 倍标准差
+
+# 实时对话上行 (subsystems/uplink.py)
+UPLINK_VAD = True             # 房间安静时不往云端送音频
+UPLINK_PRE_ROLL = 0.3         # 检测到语音时补发之前的录音 (秒)
+UPLINK_HANGOVER = 0.8         # 语音结束后继续发送的时间 (秒)，须长于服务端 VAD 的断句静音
+UPLINK_MAX_BATCH = 5          # 发送跟不上时最多合并几块 (每块 60ms) 成一条消息
+UPLINK_KEEPALIVE = 5.0        # 门控期间每隔这么久 (秒) 发一块静音保活
+
+# 实时对话会话 (subsystems/zhipu_driver.py): 连接常驻，唤醒只是开始一轮对话
+REALTIME_IDLE_TIMEOUT = 12.0  # 双方都没出声超过这么多秒，结束本轮对话回到待机
+REALTIME_IDLE_PING = 20.0     # 待机时每隔这么久 (秒) ping 一次，保持连接不被断开
+REALTIME_TOKEN_TTL = 3600     # JWT 有效期 (秒)
+REALTIME_TOKEN_REFRESH = 300  # 剩余有效期不足这么多秒时重新签发 (否则重连直接复用)
+REALTIME_RECONNECT_MAX = 30.0 # 断线重连的最大退避间隔 (秒)
 
-# 模型文件
-DNN_MODEL = "face_detection_yunet_2023mar.onnx"
+# 打断 (barge-in) 与回声抑制 (subsystems/zhipu_driver.py, subsystems/uplink.py)
+BARGE_IN_LOCAL = True         # 本地门控检测到用户开口就立刻打断，不等服务端 VAD 往返
+BARGE_IN_MIN_SPEECH = 0.1     # 本地打断要求的连续语音时长 (秒)，滤掉咳嗽、敲击、舵机声等短促声音
+BARGE_IN_REOPEN_LATENCY = 0.05 # 声卡输出缓冲深于这么多秒时，打断时重开扬声器丢掉其中的音频
+ECHO_SUPPRESS = True          # 播放期间用播放参考信号抑制麦克风里的回声
+ECHO_TAIL = 0.3               # 播放 -> 麦克风的最大延迟 (秒): 声卡缓冲 + 声学路径
+ECHO_MARGIN = 2.0             # 麦克风能量超过 "估计回声" 这么多倍才算用户插话 (双讲)
+ECHO_ADAPT = 0.02             # 回声耦合系数向上跟踪的速度 (向下快速跟踪)
+ECHO_REF_FLOOR = 0.003        # 参考信号 RMS 低于此值视为没在播放
@@ -0,0 +1,131 @@
+import threading
+import queue
+import itertools
+import time
+from concurrent.futures import Future
+
+# 请求优先级 (数字越小越先执行)
+PRIO_SAFETY = 0     # 扭矩开关、急停
+PRIO_TRACKING = 1   # 视觉追踪
+PRIO_MOTION = 2     # 表情动作 / 轨迹
+PRIO_TELEMETRY = 3  # 遥测读取
+
+class ServoBus:
+    """
+    串口总线调度器: 由一个后台线程独占 ServoDriver
+    其他线程只往队列里提交读写请求，数据包不会在 /dev/ttyUSB0 上交错。
+    - 同一 tick 内对同一舵机的位置写入会被合并，只发最新值 (一个 SYNC WRITE 包)
+    - 读请求返回 Future，由调用方决定是否等待
+    """
+    def __init__(self, driver, tick=0.005):
+        self.driver = driver
+        self.tick = tick # 位置写入的最小间隔 (合并窗口)
+
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending = {} # {id: (pos, speed, priority)}
+        self._pending_seq = None
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_flush = 0.0
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ---------------------------------------------------------
+    # ✍️ 写请求 (不阻塞)
+    # ---------------------------------------------------------
+    def write_pos(self, id, position, speed=0, priority=PRIO_MOTION):
+        self.sync_write_positions({id: (position, speed)}, priority)
+
+    def sync_write_positions(self, targets, priority=PRIO_MOTION):
+        """targets: {id: (position, speed)}，与 ServoDriver 接口一致"""
+        with self._pending_lock:
+            if not self._pending:
+                self._pending_seq = next(self._seq)
+            for id, (position, speed) in targets.items():
+                old = self._pending.get(id)
+                # 同一 tick 内，低优先级的写入不能覆盖高优先级 (如追踪) 的目标
+                if old is None or priority <= old[2]:
+                    self._pending[id] = (position, speed, priority)
+        self._wake.set()
+
+    def enable_torque(self, id, enable=1, priority=PRIO_SAFETY):
+        return self._submit(priority, self.driver.enable_torque, id, enable)
+
+    # ---------------------------------------------------------
+    # 📖 读请求 (返回 Future)
+    # ---------------------------------------------------------
+    def submit_read_pos(self, id, priority=PRIO_TELEMETRY):
+        return self._submit(priority, self.driver.read_pos, id)
+
+    def submit_read_state(self, ids, priority=PRIO_TELEMETRY):
+        return self._submit(priority, self.driver.read_state, list(ids))
+
+    def read_pos(self, id, timeout=0.5):
+        """阻塞版，保持与 ServoDriver.read_pos 相同的返回约定 (失败 -1)"""
+        try: return self.submit_read_pos(id).result(timeout)
+        except Exception: return -1
+
+    def read_state(self, ids, timeout=0.5):
+        try: return self.submit_read_state(ids).result(timeout)
+        except Exception: return {}
+
+    def flush(self, timeout=1.0):
+        """等待此前提交的所有请求执行完毕"""
+        try: self._submit(PRIO_TELEMETRY + 1, lambda: None).result(timeout)
+        except Exception: pass
+
+    def close(self):
+        self.flush()
+        self.running = False
+        self._wake.set()
+        self._thread.join(timeout=1.0)
+        self.driver.close()
+
+    def _submit(self, priority, fn, *args):
+        future = Future()
+        self._queue.put((priority, next(self._seq), fn, args, future))
+        self._wake.set()
+        return future
+
+    # ---------------------------------------------------------
+    # 🔩 总线线程
+    # ---------------------------------------------------------
+    def _run(self):
+        while self.running:
+            self._wake.wait(self.tick)
+            self._wake.clear()
+
+            # 合并窗口: 两次位置下发之间至少间隔一个 tick
+            with self._pending_lock:
+                has_pending = bool(self._pending)
+            if has_pending:
+                wait = self._last_flush + self.tick - time.monotonic()
+                if wait > 0: time.sleep(wait)
+
+            jobs = []
+            while True:
+                try: jobs.append(self._queue.get_nowait())
+                except queue.Empty: break
+
+            with self._pending_lock:
+                if self._pending:
+                    priority = min(p for _, _, p in self._pending.values())
+                    targets = {id: (pos, spd) for id, (pos, spd, _) in self._pending.items()}
+                    jobs.append((priority, self._pending_seq, self.driver.sync_write_positions, (targets,), None))
+                    self._pending = {}
+
+            # 按 (优先级, 提交顺序) 执行
+            jobs.sort(key=lambda job: job[:2])
+            for priority, _, fn, args, future in jobs:
+                if future is not None and not future.set_running_or_notify_cancel(): continue
+                try:
+                    result = fn(*args)
+                    if future is not None: future.set_result(result)
+                except Exception as e:
+                    if future is not None: future.set_exception(e)
+                    else: print(f"Servo Bus Error: {e}")
+                if fn == self.driver.sync_write_positions:
+                    self._last_flush = time.monotonic()
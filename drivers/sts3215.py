@@ -1,10 +1,22 @@
 import serial
 import time
 
+# STS 协议常量
+BROADCAST_ID = 0xFE
+INST_READ = 0x02
+INST_WRITE = 0x03
+INST_SYNC_READ = 0x82
+INST_SYNC_WRITE = 0x83
+REG_GOAL_POSITION = 0x2A
+REG_PRESENT_POSITION = 0x38  # 位置(2) 速度(2) 负载(2) 电压(1) 温度(1)
+STATE_LEN = 8
+MAX_PACKET_LENGTH = 0x50 # 长度字节 = 参数数 + 2；寄存器表不足 0x50 字节，更大的长度只可能是误码
+
 class ServoDriver:
     def __init__(self, port='/dev/ttyUSB0', baudrate=1000000):
         try:
             self.serial = serial.Serial(port, baudrate, timeout=0.05)
+            self._rx = bytearray()
             print(f"✅ 串口已打开: {port} @ {baudrate}")
         except Exception as e:
             print(f"❌ 串口打开失败: {e}")
@@ -59,45 +71,152 @@ class ServoDriver:
             self.serial.write(bytearray(packet))
         except: pass
 
-    def read_pos(self, id):
+    def sync_write_positions(self, targets):
         """
-        读取舵机当前位置 (修复版核心功能)
+        广播 SYNC WRITE: 一个数据包同时下发所有舵机的目标
+        targets: {id: (position, speed)}
         """
-        if not self.serial: return -1
-        
+        if not self.serial or not targets: return
+
+        # 每个舵机的数据: ID + 位置(2字节) + 速度(2字节)，与 write_pos 的寄存器布局一致
+        data_len = 4
+        params = [REG_GOAL_POSITION, data_len]
+        for id, (position, speed) in targets.items():
+            position = max(0, min(4096, int(position)))
+            speed = max(0, min(3000, int(speed)))
+            params += [id, position & 0xFF, (position >> 8) & 0xFF, speed & 0xFF, (speed >> 8) & 0xFF]
+
+        # FF FF FE Len 83 Addr DataLen [ID D0 D1 D2 D3]... Checksum
+        length = len(params) + 2
+        check_sum = (~(BROADCAST_ID + length + INST_SYNC_WRITE + sum(params))) & 0xFF
+        packet = [0xFF, 0xFF, BROADCAST_ID, length, INST_SYNC_WRITE] + params + [check_sum]
+
         try:
-            # 清空缓存，防止读到旧数据
-            self.serial.flushInput()
-            
-            # 构造读取指令: Read (0x02)
-            # 读取 0x38 (Present Position) 寄存器，读 2 个字节
-            # FF FF ID 04 02 38 02 Checksum
-            length = 4
-            instruction = 0x02 # Read
-            reg_addr = 0x38    # 当前位置寄存器
-            read_len = 2       # 读2字节
-            
-            check_sum = (~(id + length + instruction + reg_addr + read_len)) & 0xFF
-            packet = [0xFF, 0xFF, id, length, instruction, reg_addr, read_len, check_sum]
-            
             self.serial.write(bytearray(packet))
-            # 增加一点等待时间，确保数据传回
-            time.sleep(0.005) 
-            
-            if self.serial.in_waiting >= 8:
-                response = self.serial.read(8)
-                
-                # 校验头 FF FF
-                if response[0] == 0xFF and response[1] == 0xFF:
-                    # STS 协议返回: FF FF ID Len Err P1 P2 Check
-                    # P1(低位)=response[5], P2(高位)=response[6]
-                    pos_L = response[5]
-                    pos_H = response[6]
-                    current_pos = (pos_H << 8) + pos_L
-                    
-                    if current_pos > 4096: return -1
-                    return current_pos
-        except:
-            pass
-            
-        return -1
+        except: pass
+
+    def _read_packet(self, expected_id, timeout=0.01):
+        """
+        状态包解析器: 在 FF FF 上重新同步，校验 ID / 长度 / 校验和
+        数据一到就返回，不做固定延时。返回 (error, params) 或 None (超时)
+        """
+        deadline = time.monotonic() + timeout
+        buf = self._rx
+        # 读超时只在本次解析期间临时修改，结束后恢复，不影响串口的其他使用者
+        original_timeout = self.serial.timeout
+        try:
+            return self._parse_packets(expected_id, deadline, buf)
+        finally:
+            if self.serial.timeout != original_timeout: self.serial.timeout = original_timeout
+
+    def _parse_packets(self, expected_id, deadline, buf):
+        while True:
+            start = buf.find(b'\xff\xff')
+            if start < 0:
+                # 保留末尾可能是半个帧头的 0xFF
+                del buf[:-1 if buf[-1:] == b'\xff' else len(buf)]
+            else:
+                del buf[:start]
+                if len(buf) >= 4:
+                    id, length = buf[2], buf[3]
+                    if id == 0xFF or length < 2 or length > MAX_PACKET_LENGTH:
+                        del buf[:1] # 假帧头 (FF FF FF) 或长度非法，跳过一个字节重新同步
+                        continue
+                    total = 4 + length
+                    if len(buf) >= total:
+                        packet = bytes(buf[:total])
+                        if (~sum(packet[2:-1])) & 0xFF != packet[-1]:
+                            del buf[:1]
+                            continue
+                        del buf[:total]
+                        # STS 返回: FF FF ID Len Err P1..Pn Check
+                        if id == expected_id:
+                            return packet[4], packet[5:-1]
+                        continue # 其他舵机的残留应答，丢弃
+
+            # 只等待还缺的字节数
+            need = max(1, (4 + buf[3] - len(buf)) if len(buf) >= 4 else 4 - len(buf))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: return None
+            self.serial.timeout = remaining
+            chunk = self.serial.read(max(need, self.serial.in_waiting))
+            if not chunk: return None
+            buf += chunk
+
+    def read(self, id, reg_addr, read_len, timeout=0.01):
+        """读取单个舵机的寄存器，失败返回 None"""
+        if not self.serial: return None
+        try:
+            # 清掉上一次事务的残留
+            self.serial.reset_input_buffer()
+            self._rx.clear()
+
+            # FF FF ID 04 02 Addr Len Checksum
+            length = 4
+            check_sum = (~(id + length + INST_READ + reg_addr + read_len)) & 0xFF
+            self.serial.write(bytearray([0xFF, 0xFF, id, length, INST_READ, reg_addr, read_len, check_sum]))
+
+            reply = self._read_packet(id, timeout)
+            if reply and len(reply[1]) == read_len:
+                return reply[1]
+        except: pass
+        return None
+
+    def sync_read(self, ids, register, length, timeout=0.005):
+        """
+        广播 SYNC READ: 一次事务读取多个舵机的同一段寄存器
+        返回 {id: bytes}，没有应答的舵机不在结果中
+        """
+        if not self.serial or not ids: return {}
+        results = {}
+        try:
+            self.serial.reset_input_buffer()
+            self._rx.clear()
+
+            # FF FF FE Len 82 Addr DataLen ID1 ID2 ... Checksum
+            params = [register, length] + list(ids)
+            pkt_len = len(params) + 2
+            check_sum = (~(BROADCAST_ID + pkt_len + INST_SYNC_READ + sum(params))) & 0xFF
+            self.serial.write(bytearray([0xFF, 0xFF, BROADCAST_ID, pkt_len, INST_SYNC_READ] + params + [check_sum]))
+
+            # 舵机按 ID 顺序依次应答
+            for id in ids:
+                reply = self._read_packet(id, timeout)
+                if reply and len(reply[1]) == length:
+                    results[id] = reply[1]
+        except: pass
+        return results
+
+    @staticmethod
+    def _signed(value, sign_bit):
+        """STS 的符号位编码 -> 有符号整数"""
+        if value & (1 << sign_bit):
+            return -(value & ((1 << sign_bit) - 1))
+        return value
+
+    def read_state(self, ids):
+        """
+        一次 SYNC READ 读取全部遥测
+        返回 {id: {"pos", "speed", "load", "voltage", "temp"}}
+        """
+        states = {}
+        for id, data in self.sync_read(ids, REG_PRESENT_POSITION, STATE_LEN).items():
+            states[id] = {
+                "pos": data[0] | (data[1] << 8),
+                "speed": self._signed(data[2] | (data[3] << 8), 15),
+                "load": self._signed(data[4] | (data[5] << 8), 10),
+                "voltage": data[6] / 10.0, # 单位 0.1V
+                "temp": data[7],
+            }
+        return states
+
+    def read_pos(self, id):
+        """
+        读取舵机当前位置
+        """
+        data = self.read(id, REG_PRESENT_POSITION, 2)
+        if data is None: return -1
+
+        current_pos = data[0] | (data[1] << 8)
+        if current_pos > 4096: return -1
+        return current_pos
@@ -6,12 +6,16 @@ import atexit
 import cv2
 import datetime
 import random
-from flask import Flask, Response, jsonify, render_template
+from flask import Flask, Response, jsonify, render_template, request
 import config
 from drivers.sts3215 import ServoDriver
+from drivers.bus import ServoBus
 from subsystems.vision import VisionSystem
+from subsystems.streamer import JpegBroadcaster
 from subsystems.actions import ActionEngine
+from subsystems.tracking import TrackingController
 from subsystems.ears import Ear # 仅用于唤醒
+from subsystems.mic import MicCapture
 from subsystems.zhipu_driver import ZhipuRealtimeClient # 新核心
 
 app = Flask(__name__, static_folder='static')
@@ -21,19 +25,28 @@ os.makedirs(PHOTO_DIR, exist_ok=True)
 running = True
 SYSTEM_STATUS = {"chat_log": [], "latest_photo": None}
 
-driver = None; vision = None; actor = None; ears = None
+driver = None; bus = None; vision = None; actor = None; ears = None; tracker = None
+mic = None # 常驻麦克风采集，Ear 和实时对话共用
+broadcaster = None
 realtime_bot = None 
 
 def emergency_shutdown():
-    global driver, running
+    global bus, running
     print("\n🛑 安全停机...")
     running = False 
     if realtime_bot: realtime_bot.stop()
-    if driver and actor:
+    if mic: mic.close()
+    if tracker: tracker.stop()
+    if bus and actor:
         try:
-            for i in config.EXIT_POSE.keys(): driver.enable_torque(i, 1)
+            for i in config.EXIT_POSE.keys(): bus.enable_torque(i, 1)
             time.sleep(0.05)
-            actor._smooth_move(config.EXIT_POSE[config.ID_PAN], config.EXIT_POSE[config.ID_TILT], 1.5)
+            handle = actor._smooth_move(config.EXIT_POSE[config.ID_PAN], config.EXIT_POSE[config.ID_TILT], 1.5)
+            if handle: handle.wait(3.0)
+            actor.executor.stop()
+            # 其余关节一次性收纳
+            bus.sync_write_positions({i: (pos, 40) for i, pos in config.EXIT_POSE.items()})
+            bus.close()
         except: pass
 atexit.register(emergency_shutdown)
 
@@ -60,84 +73,123 @@ def perform_capture():
 def index(): return render_template('index.html')
 @app.route('/video_feed')
 def video_feed():
+    # 画质参数: /video_feed?scale=0.5&quality=50&fps=10
+    scale = request.args.get('scale', 1.0, type=float)
+    quality = request.args.get('quality', None, type=int)
+    fps = request.args.get('fps', None, type=float)
     def gen():
-        while running:
-            if vision:
-                frame_bytes = vision.get_latest_jpeg()
+        while running and not broadcaster: time.sleep(1)
+        if not broadcaster: return
+        client = broadcaster.subscribe(scale, quality, fps)
+        try:
+            while running:
+                # 等本档位的下一帧新画面 (同档位客户端共享同一份 JPEG，没有新画面就不发)
+                frame_bytes = client.wait_next()
                 if frame_bytes: yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.04)
+        finally:
+            client.close() # 客户端断开后退订，没人看时编码线程自动暂停
     return Response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame')
 @app.route('/get_status')
-def get_status(): return jsonify(SYSTEM_STATUS)
+def get_status():
+    if tracker: SYSTEM_STATUS["tracking"] = tracker.get_stats()
+    if vision: SYSTEM_STATUS["vision"] = vision.get_stats()
+    bot = realtime_bot
+    if bot: SYSTEM_STATUS["voice"] = bot.get_stats()
+    return jsonify(SYSTEM_STATUS)
 
-def control_loop():
-    while running:
-        if actor: time.sleep(0.05)
+def start_realtime():
+    """创建并启动实时对话客户端，失败时打印原因并返回 None (开机时和唤醒时都会调)"""
+    global realtime_bot
+    if realtime_bot: return realtime_bot
+    if not mic:
+        print("⚠️ 实时对话不可用: 麦克风没有打开")
+        return None
+    bot = None
+    try:
+        bot = ZhipuRealtimeClient(action_engine=actor, mic=mic)
+        bot.start()
+    except Exception as e:
+        print(f"⚠️ 实时对话初始化失败: {e}")
+        if bot:
+            try: bot.stop()
+            except Exception: pass
+        return None
+    realtime_bot = bot
+    return bot
 
 def voice_loop():
-    global realtime_bot
-    print("👂 待机中... 请说 'Friday' 或 '管家' 唤醒")
+    if ears:
+        # 提示实际生效的唤醒词 (唤醒词模型是中文的，只认 KWS_KEYWORDS)
+        shown = list(dict.fromkeys(w.lower() for w in ears.wake_words))
+        print(f"👂 待机中... 请说 {' / '.join(repr(w) for w in shown)} 唤醒")
     
-    WAKE_WORDS = ["friday", "Friday", "管家", "星期五"]
-    is_in_session = False
+    WAKE_WORDS = config.WAKE_WORDS
     
     while running:
-        # 1. 如果不在通话中，使用 Ears 监听唤醒词
-        if not is_in_session:
-            if not ears: time.sleep(1); continue
-            
-            # 使用本地监听（这时候并不占线，因为 Realtime Client 还没启动）
-            text = ears.listen()
+        # 1. 待机: 用 Ears 监听唤醒词 (实时连接已经建好，只是不上传麦克风)
+        if not ears: time.sleep(1); continue
+        
+        if ears.kws is not None:
+            # 常驻唤醒词检测 (小模型，只认关键词)，命中后才进入对话
+            triggered = bool(ears.wait_for_wake(timeout=30))
+        else:
+            # 流式识别时部分结果里一出现唤醒词就返回，不用等整句说完
+            text = ears.listen(wake_words=WAKE_WORDS)
             if not text: continue
             
             triggered = False
             for w in WAKE_WORDS:
                 if w in text: triggered = True; break
-            
-            if triggered:
-                print(f"✨ 唤醒成功! 连接云端大脑...")
-                if actor: actor.execute("happy")
-                
-                # 启动全双工客户端
-                # 注意：启动前需要释放 ears 对麦克风的占用？
-                # PyAudio 通常允许多个流，如果报错可能需要 ears.close()
-                realtime_bot = ZhipuRealtimeClient(action_engine=actor)
-                realtime_bot.start()
-                is_in_session = True
-                
-                # 通话限时 30秒 (演示用)
-                # 在这30秒内，主线程只是在等待，实际交互在 ZhipuRealtimeClient 的后台线程中进行
-                for _ in range(30):
-                    if not running: break
-                    time.sleep(1)
-                
-                print("💤 会话结束，回归待机。")
-                realtime_bot.stop()
-                realtime_bot = None
-                is_in_session = False
-                # 稍微冷却一下，防止立刻误触
-                time.sleep(2)
-        else:
-            time.sleep(1)
+        
+        if not triggered: continue
+        # 开机时没起来 (网络 / 声卡 / 密钥问题) 的话，唤醒时再试一次，仍失败就说明原因再回待机
+        if not start_realtime():
+            print("⚠️ 实时对话不可用，忽略本次唤醒")
+            continue
+        
+        print(f"✨ 唤醒成功! 进入对话...")
+        if actor: actor.execute("happy")
+        
+        # 2. 对话: 连接常驻，这里只是开始上传麦克风，实际交互在 ZhipuRealtimeClient 的后台线程中进行
+        realtime_bot.activate()
+        # 双方都安静超过 REALTIME_IDLE_TIMEOUT 才结束 (说话 / 播放回复都会续期)
+        while running and realtime_bot.idle_for() < config.REALTIME_IDLE_TIMEOUT:
+            time.sleep(0.2)
+        
+        print("💤 会话结束，回归待机。")
+        realtime_bot.deactivate()
+        # 稍微冷却一下，防止立刻误触
+        time.sleep(2)
 
 def main():
-    global driver, vision, actor, ears, running
+    global driver, bus, vision, actor, ears, tracker, broadcaster, mic, realtime_bot, running
     print("\n🚀 LELAMP V36 - GLM-4-Voice REALTIME")
     
     try: driver = ServoDriver(config.SERIAL_PORT, config.BAUDRATE)
     except: pass
     if driver:
-        for i, pos in config.START_POSE.items():
-            driver.enable_torque(i, 1); driver.write_pos(i, pos, 40); time.sleep(0.1)
+        # 串口只归总线线程所有，其他模块一律通过 bus 访问
+        bus = ServoBus(driver)
+        for i in config.START_POSE.keys(): bus.enable_torque(i, 1)
+        bus.sync_write_positions({i: (pos, 40) for i, pos in config.START_POSE.items()})
+        time.sleep(0.5)
     
     try: vision = VisionSystem()
     except: pass
-    try: ears = Ear() # 唤醒监听专用
+    if vision: broadcaster = JpegBroadcaster(vision)
+    # 麦克风只打开这一次，之后唤醒 / 识别 / 实时对话都从同一个环形缓冲区读
+    try: mic = MicCapture()
+    except: pass
+    try: ears = Ear(mic) # 唤醒监听专用
     except: pass
-    actor = ActionEngine(driver)
+    actor = ActionEngine(bus)
+    # 实时对话客户端开机就预热: 扬声器、连接、session.update 都提前准备好，唤醒后直接开聊
+    start_realtime()
     
     threading.Thread(target=lambda: app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False), daemon=True).start()
-    threading.Thread(target=control_loop, daemon=True).start()
+    # 视觉闭环追踪 (固定频率线程)
+    tracker = TrackingController(vision, actor)
+    tracker.start()
     
     try:
         voice_loop()
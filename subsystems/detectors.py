@@ -0,0 +1,151 @@
+import os
+import cv2
+import numpy as np
+import config
+
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
+# 检测结果: 每行一个目标 (左上角 x/y、宽高均为原图像素)
+DETECTION_DTYPE = np.dtype([("x", np.float32), ("y", np.float32), ("w", np.float32), ("h", np.float32),
+                            ("score", np.float32), ("class_id", np.int32)])
+
+def decode_yolov8(output, x_factor, y_factor, conf_threshold=0.4, nms_threshold=0.45, classes=(0,)):
+    """
+    YOLOv8 输出解码 (批量 NumPy，无逐行 Python 循环)
+    output: (4 + 类别数, 候选框数)，例如 (84, 8400)
+    返回 DETECTION_DTYPE 结构化数组 (已做 NMS)
+    """
+    class_scores = output[4:]
+    class_ids = np.argmax(class_scores, axis=0)
+    scores = np.take_along_axis(class_scores, class_ids[np.newaxis, :], axis=0)[0]
+
+    keep = scores >= conf_threshold
+    if classes is not None:
+        keep &= np.isin(class_ids, classes)
+    if not keep.any():
+        return np.empty(0, dtype=DETECTION_DTYPE)
+
+    cx, cy, bw, bh = output[:4, keep]
+    boxes = np.stack([(cx - bw * 0.5) * x_factor, (cy - bh * 0.5) * y_factor, bw * x_factor, bh * y_factor], axis=1)
+    scores = scores[keep]
+    class_ids = class_ids[keep]
+
+    indices = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), conf_threshold, nms_threshold)
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+    detections = np.empty(len(indices), dtype=DETECTION_DTYPE)
+    detections["x"], detections["y"], detections["w"], detections["h"] = boxes[indices].T
+    detections["score"] = scores[indices]
+    detections["class_id"] = class_ids[indices]
+    return detections
+
+def letterbox(frame, size):
+    """
+    等比缩放并用灰边填充到 size x size (不拉伸画面)
+    返回 (图像, 缩放比例, (左侧填充, 顶部填充))
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / w, size / h)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return canvas, scale, (pad_x, pad_y)
+
+
+class Detector:
+    """
+    检测后端基类: letterbox 预处理 + 推理 + YOLOv8 解码
+    子类只需实现 _forward(blob)，返回 (4 + 类别数, 候选框数) 的原始输出
+    """
+    name = "base"
+
+    def __init__(self, model_path, input_size=640, threads=4, conf_threshold=0.4, nms_threshold=0.45):
+        self.model_path = model_path
+        self.input_size = input_size
+        self.threads = threads
+        self.conf_threshold = conf_threshold
+        self.nms_threshold = nms_threshold
+
+    def _forward(self, blob):
+        raise NotImplementedError
+
+    def detect(self, frame):
+        """返回 DETECTION_DTYPE 数组，坐标为原图像素"""
+        image, scale, (pad_x, pad_y) = letterbox(frame, self.input_size)
+        blob = cv2.dnn.blobFromImage(image, 1/255.0, swapRB=True, crop=False)
+        detections = decode_yolov8(self._forward(blob), 1.0, 1.0, self.conf_threshold, self.nms_threshold)
+        # letterbox 坐标 -> 原图坐标
+        detections["x"] = (detections["x"] - pad_x) / scale
+        detections["y"] = (detections["y"] - pad_y) / scale
+        detections["w"] /= scale
+        detections["h"] /= scale
+        return detections
+
+
+class OpenCVDetector(Detector):
+    """OpenCV DNN (原有方案)"""
+    name = "opencv"
+
+    def __init__(self, model_path, **kwargs):
+        super().__init__(model_path, **kwargs)
+        # 注意: 这是进程级设置，JPEG 编码 (streamer)、运动门控等所有 cv2 调用都会受同样的线程数限制
+        cv2.setNumThreads(self.threads)
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def _forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward()[0]
+
+
+class OnnxRuntimeDetector(Detector):
+    """ONNX Runtime (CPU)，可直接加载 INT8 量化模型"""
+    name = "onnxruntime"
+
+    def __init__(self, model_path, **kwargs):
+        super().__init__(model_path, **kwargs)
+        if not ORT_AVAILABLE:
+            raise RuntimeError("onnxruntime 未安装")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads # 单次推理内部并行
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _forward(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0][0]
+
+
+BACKENDS = {
+    OpenCVDetector.name: OpenCVDetector,
+    OnnxRuntimeDetector.name: OnnxRuntimeDetector,
+}
+
+def create_detector(backend=None, model_path=None, input_size=None, threads=None):
+    """按参数 (默认取 config.DETECTOR_*) 创建检测后端，失败返回 None"""
+    backend = backend or config.DETECTOR_BACKEND
+    model_path = model_path or config.DETECTOR_MODEL
+    input_size = input_size or config.DETECTOR_INPUT_SIZE
+    threads = threads or config.DETECTOR_THREADS
+
+    if not os.path.exists(model_path):
+        print(f"⚠️ 未找到 YOLO 模型: {model_path}")
+        return None
+    if backend not in BACKENDS:
+        print(f"⚠️ 未知检测后端: {backend}")
+        return None
+    try:
+        detector = BACKENDS[backend](model_path, input_size=input_size, threads=threads)
+        print(f"✅ YOLOv8 加载成功 [{backend} @ {input_size}x{input_size}]")
+        return detector
+    except Exception as e:
+        print(f"❌ 检测后端 {backend} 加载失败: {e}")
+        return None
@@ -1,18 +1,42 @@
 import sys
 import os
-import pyaudio
 import numpy as np
 import sherpa_onnx
 import time
 import glob
 import re
-from collections import deque
+import tempfile
+import config
+from subsystems.mic import MicCapture
+from subsystems.vad import SpeechDetector, SpeechSegmenter
+from subsystems.resampler import StreamingResampler
 
 class Ear:
-    def __init__(self):
+    def __init__(self, mic=None):
         print("👂 耳朵模块初始化 (V33 语义垃圾过滤版)...")
         
-        base_dir = "/home/scottwang/lelamp_v2/models/sherpa_paraformer"
+        # 流式识别器 (边听边解码)，加载失败时退回整句识别
+        self.online = None
+        if config.ASR_MODE == "streaming":
+            self.online = self._create_online_recognizer(config.ASR_ONLINE_MODEL_DIR)
+
+        self.recognizer = None
+        if self.online is None:
+            self.recognizer = self._create_offline_recognizer(config.ASR_OFFLINE_MODEL_DIR)
+
+        # 常驻唤醒词检测: 比整句识别便宜得多，且只认关键词，不会被噪声"识别"出唤醒词
+        self.kws = self._create_keyword_spotter(config.KWS_MODEL_DIR) if config.KWS_ENABLED else None
+
+        # 麦克风由常驻采集服务统一打开，这里只做读者
+        self.mic = mic or MicCapture()
+        self.hardware_rate = self.mic.rate
+        self.resampler = StreamingResampler(self.hardware_rate, 16000) # 硬件采样率 -> 16k (VAD / 识别)
+        
+        self.calibrate_noise()
+        # 语音活动检测 (Silero + 持续跟踪的底噪)，初始底噪取校准结果
+        self.detector = SpeechDetector(initial_floor=self.noise_level)
+
+    def _create_offline_recognizer(self, base_dir):
         onnx_files = glob.glob(os.path.join(base_dir, "*.onnx"))
         tokens_file = os.path.join(base_dir, "tokens.txt")
         
@@ -21,10 +45,10 @@ class Ear:
             sys.exit(1)
             
         try:
-            self.recognizer = sherpa_onnx.OfflineRecognizer.from_paraformer(
+            return sherpa_onnx.OfflineRecognizer.from_paraformer(
                 paraformer=onnx_files[0],
                 tokens=tokens_file,
-                num_threads=4,
+                num_threads=config.ASR_THREADS,
                 sample_rate=16000,
                 decoding_method="greedy_search"
             )
@@ -32,49 +56,142 @@ class Ear:
             print(f"❌ 引擎启动失败: {e}")
             sys.exit(1)
 
-        self.p = pyaudio.PyAudio()
-        self.device_index = None
-        self.hardware_rate = 16000 
-        
-        for i in range(self.p.get_device_count()):
-            try:
-                info = self.p.get_device_info_by_index(i)
-                name = info.get('name', '')
-                if 'USB' in name and 'Webcam' not in name:
-                    self.device_index = i
-                    print(f"✅ 锁定独立麦克风: {name}")
-                    break 
-            except: pass
-            
-        for rate in [48000, 44100, 16000]:
-            try:
-                stream = self.p.open(format=pyaudio.paFloat32, channels=1, rate=rate,
-                                   input=True, input_device_index=self.device_index, 
-                                   frames_per_buffer=1024)
-                stream.close()
-                self.hardware_rate = rate
-                break
-            except: continue
-        
-        self.calibrate_noise()
+    def _create_online_recognizer(self, base_dir):
+        """
+        流式识别器: 目录里有 joiner 就按 zipformer transducer 加载，否则按流式 paraformer
+        断句由 VAD (subsystems/vad.py) 负责，识别器只处理语音片段
+        """
+        def find(name):
+            # 优先 int8 量化版本
+            files = sorted(glob.glob(os.path.join(base_dir, f"{name}*.onnx")), key=lambda f: "int8" not in f)
+            return files[0] if files else None
+
+        tokens_file = os.path.join(base_dir, "tokens.txt")
+        encoder, decoder, joiner = find("encoder"), find("decoder"), find("joiner")
+        if not encoder or not decoder or not os.path.exists(tokens_file):
+            print(f"⚠️ 流式模型未找到 ({base_dir})，改用整句识别")
+            return None
+
+        try:
+            if joiner:
+                recognizer = sherpa_onnx.OnlineRecognizer.from_transducer(
+                    tokens=tokens_file, encoder=encoder, decoder=decoder, joiner=joiner,
+                    num_threads=config.ASR_THREADS, sample_rate=16000, feature_dim=80,
+                    decoding_method="greedy_search")
+            else:
+                recognizer = sherpa_onnx.OnlineRecognizer.from_paraformer(
+                    tokens=tokens_file, encoder=encoder, decoder=decoder,
+                    num_threads=config.ASR_THREADS, sample_rate=16000, feature_dim=80,
+                    decoding_method="greedy_search")
+            print(f"✅ 流式识别已启用: {os.path.basename(encoder)}")
+            return recognizer
+        except Exception as e:
+            print(f"⚠️ 流式识别启动失败: {e}，改用整句识别")
+            return None
+
+    def _create_keyword_spotter(self, base_dir):
+        """加载 KeywordSpotter，并把 config.KWS_KEYWORDS 切分成模型的 token 写入关键词文件"""
+        def find(name):
+            files = sorted(glob.glob(os.path.join(base_dir, f"{name}*.onnx")), key=lambda f: "int8" not in f)
+            return files[0] if files else None
+
+        tokens_file = os.path.join(base_dir, "tokens.txt")
+        encoder, decoder, joiner = find("encoder"), find("decoder"), find("joiner")
+        if not (encoder and decoder and joiner and os.path.exists(tokens_file)):
+            print(f"⚠️ 唤醒词模型未找到 ({base_dir})，用语音识别匹配唤醒词")
+            return None
+
+        keywords_file = None
+        try:
+            tokenized = sherpa_onnx.text2token(config.KWS_KEYWORDS, tokens=tokens_file, tokens_type=config.KWS_TOKENS_TYPE)
+            # 关键词文件只在构造时读取一次，用完即删
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", prefix="lelamp_keywords_", suffix=".txt", delete=False) as f:
+                keywords_file = f.name
+                for word, tokens in zip(config.KWS_KEYWORDS, tokenized):
+                    f.write(f"{' '.join(tokens)} @{word}\n")
+
+            kws = sherpa_onnx.KeywordSpotter(
+                tokens=tokens_file, encoder=encoder, decoder=decoder, joiner=joiner,
+                num_threads=config.KWS_THREADS, keywords_file=keywords_file,
+                keywords_score=config.KWS_SCORE, keywords_threshold=config.KWS_THRESHOLD,
+                max_active_paths=4)
+            print(f"✅ 唤醒词检测已启用: {' / '.join(config.KWS_KEYWORDS)}")
+            return kws
+        except Exception as e:
+            print(f"⚠️ 唤醒词引擎启动失败: {e}，用语音识别匹配唤醒词")
+            return None
+        finally:
+            if keywords_file:
+                try: os.remove(keywords_file)
+                except OSError: pass
+
+    @property
+    def wake_words(self):
+        """当前实际生效的唤醒词: 唤醒词模型只认 KWS_KEYWORDS，语音识别匹配时用 WAKE_WORDS"""
+        return config.KWS_KEYWORDS if self.kws is not None else config.WAKE_WORDS
+
+    def wait_for_wake(self, mouth_ref=None, timeout=None):
+        """
+        常驻唤醒词检测: 阻塞直到命中关键词，返回命中的词；超时返回 ""
+        只跑小模型的关键词搜索，不做整句识别
+        """
+        reader = self.mic.subscribe()
+
+        s = self.kws.create_stream()
+        start = time.time()
+        keyword = ""
+        try:
+            while not keyword:
+                if timeout is not None and time.time() - start > timeout: break
+
+                # 自己说话时不检测，避免自己唤醒自己
+                if mouth_ref and mouth_ref.is_speaking:
+                    time.sleep(0.1); reader.skip_to_latest()
+                    continue
+
+                samples = self._read_chunk(reader)
+                s.accept_waveform(self.hardware_rate, np.clip(samples, -1.0, 1.0))
+                while self.kws.is_ready(s):
+                    self.kws.decode_stream(s)
+                    keyword = self.kws.get_result(s)
+                    if keyword:
+                        self.kws.reset_stream(s)
+                        break
+        except:
+            return ""
+        finally:
+            reader.close()
+
+        if keyword: print(f"\n✨ 唤醒词: {keyword}")
+        return keyword
 
     def calibrate_noise(self):
         print("🤫 校准底噪 (3.0x)...")
         self.gain = 3.0 
         try:
-            stream = self.p.open(format=pyaudio.paFloat32, channels=1, 
-                               rate=self.hardware_rate, input=True, 
-                               input_device_index=self.device_index, frames_per_buffer=1024)
+            reader = self.mic.subscribe()
             noise_levels = []
-            for _ in range(30):
-                data = stream.read(1024, exception_on_overflow=False)
-                samples = np.frombuffer(data, dtype=np.float32) * self.gain
-                noise_levels.append(np.sqrt(np.mean(samples**2)))
-            stream.close()
-            avg = np.mean(noise_levels)
-            self.dynamic_threshold = max(avg * 2.5, 0.10) 
-            print(f"✅ 阈值设定: {self.dynamic_threshold:.4f}")
-        except: self.dynamic_threshold = 0.10
+            try:
+                for _ in range(30):
+                    samples = self._read_chunk(reader)
+                    noise_levels.append(np.sqrt(np.mean(samples**2)))
+            finally: reader.close()
+            self.noise_level = float(np.mean(noise_levels))
+            # 只用作 SpeechDetector 的初始底噪，之后由 VAD 持续跟踪
+            print(f"✅ 底噪设定: {self.noise_level:.4f}")
+        except:
+            self.noise_level = 0.02
+            print(f"⚠️ 底噪校准失败，使用默认值 {self.noise_level:.4f}")
+
+    def _read_chunk(self, reader):
+        """从采集服务读一块 (1024 样本) 并乘上增益"""
+        samples = reader.read(1024)
+        if samples is None: raise IOError("麦克风无数据")
+        return samples * self.gain
+
+    def _to_16k(self, samples):
+        """硬件采样率 -> 16k (VAD 和识别模型的输入)，逐块流式重采样"""
+        return self.resampler.process(samples)
 
     def _is_gibberish(self, text):
         """
@@ -112,54 +229,36 @@ class Ear:
 
         return False
 
-    def listen(self, mouth_ref=None):
-        try:
-            stream = self.p.open(format=pyaudio.paFloat32, channels=1, 
-                               rate=self.hardware_rate, 
-                               input=True, input_device_index=self.device_index, 
-                               frames_per_buffer=1024)
-        except: time.sleep(1); return ""
+    def listen(self, mouth_ref=None, wake_words=None):
+        """
+        听一句话，返回识别文本 (过滤后为空则返回 "")
+        wake_words: 流式模式下部分结果里一出现其中任何一个词就立刻返回，不等这句话说完
+        """
+        if self.online is not None:
+            return self._listen_streaming(mouth_ref, wake_words)
+
+        reader = self.mic.subscribe()
+        self.resampler.reset() # 新的读者从当前位置开始，与上次的音频不连续
 
         print(f"\r🎤 聆听中...", end="", flush=True)
-        frames = []
-        pre_buffer = deque(maxlen=int(self.hardware_rate/1024*0.5))
-        silence_chunks = 0
-        is_speaking = False
+        segmenter = SpeechSegmenter(self.detector)
         
         try:
             while True:
                 # 硬件级静音
                 if mouth_ref and mouth_ref.is_speaking:
-                    if is_speaking: return ""
-                    time.sleep(0.1); frames.clear(); pre_buffer.clear()
+                    if segmenter.in_speech: return ""
+                    time.sleep(0.1); segmenter.reset(); reader.skip_to_latest()
                     continue
 
-                data = stream.read(1024, exception_on_overflow=False)
-                samples = np.frombuffer(data, dtype=np.float32) * self.gain
+                samples = self._read_chunk(reader)
                 samples = np.clip(samples, -1.0, 1.0)
-                vol = np.sqrt(np.mean(samples**2))
-                
-                if not is_speaking:
-                    pre_buffer.append(samples)
-                    if vol > self.dynamic_threshold:
-                        is_speaking = True
-                        silence_chunks = 0
-                        frames.extend(pre_buffer)
-                else:
-                    frames.append(samples)
-                    if vol > (self.dynamic_threshold * 0.7): silence_chunks = 0
-                    else: silence_chunks += 1
                 
-                if is_speaking and silence_chunks > 15: break 
-                if len(frames) > int(self.hardware_rate/1024*10): break 
+                # VAD 切出完整的一句 (含 pre-roll)，噪声和太短的片段不会送去识别
+                audio_data = segmenter.push(self._to_16k(samples))
+                if audio_data is not None: break
 
-            stream.stop_stream(); stream.close()
-            if not is_speaking: return ""
-            
-            audio_data = np.concatenate(frames)
-            if self.hardware_rate != 16000:
-                n = int(len(audio_data) * 16000 / self.hardware_rate)
-                audio_data = np.interp(np.linspace(0,1,n,endpoint=False), np.linspace(0,1,len(audio_data)), audio_data)
+            reader.close()
             
             s = self.recognizer.create_stream()
             s.accept_waveform(16000, audio_data)
@@ -175,4 +274,81 @@ class Ear:
                 print(f"👂 听到: {text}")
                 return text
         except: pass
+        finally: reader.close()
         return ""
+
+    def _listen_streaming(self, mouth_ref=None, wake_words=None):
+        """流式识别: VAD 判为语音后逐块送进识别器，持续输出部分结果，VAD 静音保持结束即断句"""
+        reader = self.mic.subscribe()
+        self.resampler.reset() # 新的读者从当前位置开始，与上次的音频不连续
+
+        print(f"\r🎤 聆听中...", end="", flush=True)
+        s = self.online.create_stream()
+        segmenter = SpeechSegmenter(self.detector)
+        partial = ""
+        text = ""
+
+        try:
+            while True:
+                # 硬件级静音
+                if mouth_ref and mouth_ref.is_speaking:
+                    if partial: break
+                    if segmenter.in_speech: s = self.online.create_stream()
+                    time.sleep(0.1); segmenter.reset(); reader.skip_to_latest()
+                    continue
+
+                samples = self._read_chunk(reader)
+                samples = np.clip(samples, -1.0, 1.0)
+                chunk = self._to_16k(samples)
+
+                # 只有 VAD 判为语音的部分 (含 pre-roll) 才送进识别器
+                was_speaking = segmenter.in_speech
+                segment = segmenter.push(chunk)
+                if segmenter.in_speech:
+                    s.accept_waveform(16000, chunk if was_speaking else np.concatenate(segmenter.frames))
+                elif was_speaking:
+                    # 一句结束: 补一段静音把模型里剩下的字"挤"出来
+                    if segment is not None:
+                        s.accept_waveform(16000, chunk)
+                        s.accept_waveform(16000, np.zeros(int(0.3 * 16000), dtype=np.float32))
+                        s.input_finished()
+                else:
+                    continue
+
+                while self.online.is_ready(s):
+                    self.online.decode_stream(s)
+
+                result = self.online.get_result(s)
+                result = (result if isinstance(result, str) else result.text).strip()
+                if result != partial:
+                    partial = result
+                    print(f"\r🎤 {partial}", end="", flush=True)
+                    # 部分结果里出现唤醒词: 立刻返回
+                    if wake_words and any(w in partial for w in wake_words):
+                        print()
+                        text = partial
+                        break
+
+                if not segmenter.in_speech:
+                    if segment is not None and partial:
+                        text = partial
+                        break
+                    # 太短的片段或没识别出字: 换新的识别流，接着听
+                    s = self.online.create_stream()
+                    partial = ""
+        except:
+            return ""
+        finally:
+            reader.close()
+
+        if wake_words and any(w in text for w in wake_words):
+            print(f"👂 听到: {text}")
+            return text
+
+        # 🔥 应用强力过滤器
+        if self._is_gibberish(text):
+            if text: print(f"\n🗑️ 过滤乱码: {text}")
+            return ""
+
+        print(f"\n👂 听到: {text}")
+        return text
@@ -0,0 +1,103 @@
+import threading
+import numpy as np
+
+class FrameLease:
+    """
+    环形缓冲区中一帧的租约 (引用计数)
+    持有期间该槽位不会被采集线程覆盖；frame 是只读视图，不是拷贝
+    用完调用 release()，或用 with 语句
+    """
+    def __init__(self, ring, slot, generation, frame, seq, timestamp):
+        self._ring = ring
+        self._slot = slot
+        self._generation = generation
+        self.frame = frame
+        self.seq = seq
+        self.timestamp = timestamp # 采集时刻 (time.monotonic)
+        self._released = False
+
+    def release(self):
+        if self._released: return
+        self._released = True
+        self._ring._release(self._slot, self._generation)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FrameRing:
+    """
+    预分配的 N 帧环形缓冲区，带序号和单调时钟时间戳
+    - 采集线程直接把画面读进空闲槽位 (cap.read 写入预分配内存)，不再每帧分配
+    - 消费者拿只读视图 + 租约，不再各自 copy()
+    - 被租用的槽位不会被覆盖；所有槽位都被占用时新帧直接丢弃
+    """
+    def __init__(self, size, shape, dtype=np.uint8):
+        self.size = size
+        self.cond = threading.Condition()
+        self._allocate(shape, dtype)
+
+    def _allocate(self, shape, dtype):
+        self.shape = tuple(shape)
+        self._buffers = np.empty((self.size,) + self.shape, dtype=dtype)
+        self._refs = [0] * self.size
+        self._seqs = [0] * self.size
+        self._times = [0.0] * self.size
+        self._latest = -1
+        self._generation = getattr(self, "_generation", 0) + 1
+        self.seq = getattr(self, "seq", 0)
+
+    def reshape(self, shape, dtype=np.uint8):
+        """摄像头实际分辨率与预设不符时重新分配 (旧租约仍持有旧内存，安全)"""
+        with self.cond:
+            self._allocate(shape, dtype)
+
+    def acquire_write_slot(self):
+        """取一个可写的空闲槽位 (不是最新帧且无人租用)，没有则返回 None"""
+        with self.cond:
+            for i in range(1, self.size + 1):
+                slot = (self._latest + i) % self.size
+                if slot != self._latest and self._refs[slot] == 0:
+                    return slot
+        return None
+
+    def buffer(self, slot):
+        return self._buffers[slot]
+
+    def commit(self, slot, timestamp):
+        """槽位写完，发布为最新帧"""
+        with self.cond:
+            self.seq += 1
+            self._seqs[slot] = self.seq
+            self._times[slot] = timestamp
+            self._latest = slot
+            self.cond.notify_all()
+
+    def latest_time(self):
+        with self.cond:
+            return self._times[self._latest] if self._latest >= 0 else None
+
+    def acquire_latest(self, after_seq=0, timeout=None):
+        """
+        租用最新一帧；after_seq 不为 0 时等待比它更新的帧
+        超时或停止时返回 None
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self._latest >= 0 and self.seq > after_seq, timeout):
+                return None
+            slot = self._latest
+            self._refs[slot] += 1
+            view = self._buffers[slot].view()
+            view.setflags(write=False)
+            return FrameLease(self, slot, self._generation, view, self._seqs[slot], self._times[slot])
+
+    def _release(self, slot, generation):
+        with self.cond:
+            if generation == self._generation:
+                self._refs[slot] -= 1
+
+    def wake_all(self):
+        with self.cond: self.cond.notify_all()
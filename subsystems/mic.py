@@ -0,0 +1,156 @@
+import threading
+import time
+import numpy as np
+import pyaudio
+import config
+
+class MicReader:
+    """
+    麦克风环形缓冲区上的一个读者 (唤醒词 / 识别 / 实时对话各自一个)
+    各自维护读游标，互不影响；读得太慢被覆盖时直接跳到最新数据 (记入 overruns)
+    读者在锁外拷贝样本，拷完再核对写入位置 (seqlock)，被采集线程追上就丢掉这次拷贝重读
+    """
+    def __init__(self, mic, cursor):
+        self.mic = mic
+        self.cursor = cursor # 已读到的绝对样本序号
+        self.overruns = 0
+        self.closed = False
+        self.last_time = None # 最近一次 read() 返回的最后一个样本的采集时刻 (time.monotonic)
+
+    def available(self):
+        return self.mic.written - self.cursor
+
+    def read(self, n, timeout=1.0):
+        """读 n 个样本 (float32, 单声道, mic.rate)，不足时等待；超时或已关闭返回 None"""
+        mic = self.mic
+        with mic.cond: # 锁只用来等待，拷贝在锁外
+            if not mic.cond.wait_for(lambda: mic.written - self.cursor >= n or self.closed or not mic.running, timeout):
+                return None
+        while True:
+            written, write_time = mic.head
+            if self.closed or written - self.cursor < n: return None
+            if written - self.cursor > mic.size - mic.chunk:
+                # 落后将近一整圈，旧数据已被 (或正在被) 覆盖
+                self.overruns += 1
+                self.cursor = written - n
+            start = self.cursor % mic.size
+            end = start + n
+            if end <= mic.size:
+                samples = mic.buffer[start:end].copy()
+            else:
+                samples = np.concatenate((mic.buffer[start:], mic.buffer[:end - mic.size]))
+            # 拷贝期间采集线程写到的最远位置没有绕回到这一段，拷贝才有效
+            if mic.writing - mic.size <= self.cursor: break
+        self.cursor += n
+        self.last_time = write_time - (written - self.cursor) / mic.rate
+        return samples
+
+    def skip_to_latest(self):
+        """丢弃积压 (例如自己说话期间录到的声音)"""
+        self.cursor = self.mic.written
+
+    def close(self):
+        self.closed = True
+        self.mic._unsubscribe(self)
+
+
+class MicCapture:
+    """
+    常驻麦克风采集服务: 设备只打开一次，回调模式持续写入环形缓冲区
+    唤醒词、语音识别、实时对话通过 subscribe() 拿到各自的读者，不再反复开关设备
+    回调无锁写入 (单写者)，只在唤醒等待中的读者时短暂取锁，慢读者的拷贝不会卡住音频回调
+    """
+    def __init__(self, p=None):
+        self.p = p or pyaudio.PyAudio()
+        self.device_index = self._find_device()
+        self.chunk = 1024
+
+        self.cond = threading.Condition()
+        self.readers = []
+        # 已发布的写入位置: (累计写入的样本数, 第 written 个样本的采集时刻)，整体替换，读者无需加锁
+        self.head = (0, time.monotonic())
+        self.writing = 0 # 采集线程正在写 (可能写了一半) 的区间终点 (绝对序号)，先于样本更新
+        self.overflows = 0
+        self.running = True
+
+        self.stream = None
+        self.rate = 16000
+        for rate in [48000, 44100, 16000]:
+            try:
+                self._allocate(rate)
+                self.stream = self.p.open(format=pyaudio.paFloat32, channels=1, rate=rate,
+                                          input=True, input_device_index=self.device_index,
+                                          frames_per_buffer=self.chunk, stream_callback=self._callback)
+                self.rate = rate
+                break
+            except: continue
+
+        if self.stream is None:
+            print("❌ 麦克风打开失败")
+        else:
+            self.stream.start_stream()
+            print(f"✅ 麦克风常驻采集: {self.rate}Hz")
+
+    def _find_device(self):
+        for i in range(self.p.get_device_count()):
+            try:
+                info = self.p.get_device_info_by_index(i)
+                name = info.get('name', '')
+                if info.get('maxInputChannels', 0) > 0 and ('USB' in name or 'ReSpeaker' in name) and 'Webcam' not in name:
+                    print(f"✅ 锁定独立麦克风: {name}")
+                    return i
+            except: pass
+        return None
+
+    def _allocate(self, rate):
+        self.size = int(rate * config.MIC_BUFFER_SECONDS)
+        self.buffer = np.zeros(self.size, dtype=np.float32)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow: self.overflows += 1
+        samples = np.frombuffer(in_data, dtype=np.float32)
+        n = len(samples)
+        now = time.monotonic()
+        # 无锁写入 (单写者): 先声明要覆盖的区间，再写样本，最后发布新的写入位置
+        written = self.head[0]
+        self.writing = written + n
+        start = written % self.size
+        end = start + n
+        if end <= self.size:
+            self.buffer[start:end] = samples
+        else:
+            split = self.size - start
+            self.buffer[start:] = samples[:split]
+            self.buffer[:n - split] = samples[split:]
+        self.head = (written + n, now)
+        # 只为唤醒等待中的读者取锁 (读者持锁时只判断条件，不拷贝)
+        with self.cond: self.cond.notify_all()
+        return (None, pyaudio.paContinue if self.running else pyaudio.paComplete)
+
+    @property
+    def written(self):
+        """累计写入的样本数 (绝对序号)"""
+        return self.head[0]
+
+    def subscribe(self, pre_roll=0.0):
+        """
+        新建一个读者，从当前位置开始读
+        pre_roll: 往回多给这么多秒已录好的声音 (会话开始时不丢第一个音节)
+        """
+        with self.cond:
+            back = min(int(pre_roll * self.rate), self.written, self.size - self.chunk)
+            reader = MicReader(self, self.written - back)
+            self.readers.append(reader)
+        return reader
+
+    def _unsubscribe(self, reader):
+        with self.cond:
+            if reader in self.readers: self.readers.remove(reader)
+            self.cond.notify_all()
+
+    def close(self):
+        self.running = False
+        with self.cond: self.cond.notify_all()
+        if self.stream:
+            try: self.stream.stop_stream(); self.stream.close()
+            except: pass
@@ -0,0 +1,239 @@
+import math
+import time
+import threading
+import config
+from drivers.bus import ServoBus, PRIO_TRACKING
+from subsystems.motion_planner import MotionPlanner
+
+class MotionHandle:
+    """
+    一个运动目标的句柄
+    调用方可以 wait() 等待完成、cancel() 取消、then() 串联下一个动作
+    """
+    def __init__(self, executor, targets, duration=None, dwell=0.0, vias=None, parent=None):
+        self.executor = executor
+        self.targets = dict(targets) # {id: 目标位置}
+        self.vias = list(vias or []) # 途经点 [{id: 位置}, ...]
+        self.duration = duration # 最短时长，None 表示按关节限制尽快完成
+        self.dwell = dwell # 到位后保持的时间 (秒)
+        self.status = "pending" # pending / running / done / cancelled
+        self._parent = parent
+        self._children = []
+        self._done = threading.Event()
+
+        # 由执行器填写
+        self._joints = []
+        self._trajectory = None
+        self._velocities = None
+        self._step = 0
+        self._hold_until = None
+
+    def wait(self, timeout=None):
+        """阻塞直到完成或被取消；正常完成返回 True"""
+        self._done.wait(timeout)
+        return self.status == "done"
+
+    def done(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        """取消整条动作链 (包括尚未开始的后续动作)"""
+        self.executor._cancel_chain(self)
+
+    def then(self, targets, duration=None, dwell=0.0, vias=None):
+        """本动作完成后接着执行下一个动作，返回新句柄"""
+        child = MotionHandle(self.executor, targets, duration, dwell, vias, parent=self)
+        with self.executor._lock:
+            status = self.status
+            if status in ("pending", "running"):
+                self._children.append(child)
+        if status == "done": self.executor._start(child)
+        elif status == "cancelled": child._finish("cancelled")
+        return child
+
+    def _finish(self, status):
+        self.status = status
+        self._done.set()
+
+
+class MotionExecutor:
+    """
+    后台运动执行器: 固定频率 tick，随时接受新目标
+    - 新目标从当前指令状态 (位置 + 速度) 平滑衔接，而不是从头开始
+    - 轨迹为 Double-S，受 config.JOINT_LIMITS 中每个关节的速度/加速度/加加速度限制
+    - 只抢占同一关节上的旧目标，不同关节的动作可以同时进行
+    - 调用方拿到 MotionHandle，不会被轨迹阻塞
+    """
+    def __init__(self, driver, initial_pose, frequency=50):
+        self.driver = driver
+        self.planner = MotionPlanner(frequency=frequency, limits=config.JOINT_LIMITS)
+        self.dt = self.planner.dt
+
+        self.commanded = {id: float(pos) for id, pos in initial_pose.items()}
+        self.velocity = {id: 0.0 for id in initial_pose}
+        self._stream_until = {} # {id: 时刻} 之前视为仍在被 stream 驱动
+        self._active = [] # 正在执行的句柄
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def move(self, targets, duration=None, dwell=0.0, vias=None):
+        """提交一个新目标 {id: 位置} (可带途经点)，立即返回句柄"""
+        handle = MotionHandle(self, targets, duration, dwell, vias)
+        self._start(handle)
+        return handle
+
+    def is_busy(self, joints=None):
+        """指定关节 (默认全部) 上是否还有动作在执行"""
+        with self._lock:
+            for handle in self._active:
+                if joints is None or set(joints) & set(handle._joints): return True
+        return False
+
+    def stream(self, targets, period):
+        """
+        直接下发设定点 (视觉追踪等闭环控制用)，不经过轨迹规划
+        每一步仍受 config.JOINT_LIMITS 约束: 速度不超过 vmax、速度变化不超过 amax，
+        离设定点近时按 amax 提前减速，避免冲过头；实际下发的位置见 self.commanded
+        关节上有动作在执行时让路，返回 False
+        period: 调用周期 (秒)
+        """
+        now = time.monotonic()
+        writes = {}
+        with self._lock:
+            for handle in self._active:
+                if set(targets) & set(handle._joints): return False
+            for id, pos in targets.items():
+                lim = self.planner.limits.get(id)
+                v_prev = self.velocity[id] if now < self._stream_until.get(id, 0) else 0.0
+                dist = pos - self.commanded[id]
+                v = dist / period
+                if lim:
+                    # 期望速度: 一步到位、vmax、按 amax 能刹住的速度三者取小，再按 amax 限制本周期的速度变化
+                    dv = lim["amax"] * period
+                    # 离散时间的刹车速度: 之后每周期减速 dv 恰好停在设定点
+                    brake = dv * (math.sqrt(0.25 + 2 * abs(dist) / (dv * period)) - 0.5)
+                    speed = min(abs(v), lim["vmax"], brake)
+                    v = min(max(math.copysign(speed, dist), v_prev - dv), v_prev + dv)
+                    v = max(-lim["vmax"], min(lim["vmax"], v))
+                self.velocity[id] = v
+                self.commanded[id] += v * period
+                self._stream_until[id] = now + 2 * period
+                writes[id] = (self.commanded[id], 0)
+        try:
+            if isinstance(self.driver, ServoBus): self.driver.sync_write_positions(writes, PRIO_TRACKING)
+            else: self.driver.sync_write_positions(writes)
+        except Exception as e: print(f"Servo Error: {e}")
+        return True
+
+    def cancel_all(self):
+        with self._lock:
+            for handle in list(self._active): self._cancel_chain_locked(handle)
+
+    def stop(self):
+        self.cancel_all()
+        self.running = False
+        self._wake.set()
+
+    def _start(self, handle):
+        with self._lock:
+            self._start_locked(handle)
+        self._wake.set()
+
+    def _start_locked(self, handle):
+        # 调用方持有 self._lock: 规划、登记、抢占在同一个临界区内完成，不会被其他命令插队
+        if handle.status != "pending": return
+        joints = [id for id in handle.targets if id in self.commanded]
+
+        # 抢占: 同一关节上的旧动作整条链作废
+        preempted = [old for old in self._active if set(old._joints) & set(joints)]
+
+        # 从当前指令状态 (含速度) 出发规划，实现平滑衔接
+        start = [self.commanded[id] for id in joints]
+        now = time.monotonic()
+        owned = {id for h in self._active for id in h._joints}
+        start_vel = [self.velocity[id] if id in owned or now < self._stream_until.get(id, 0) else 0.0 for id in joints]
+        end = [handle.targets[id] for id in joints]
+        vias = [[via.get(id, self.commanded[id]) for id in joints] for via in handle.vias]
+        handle._joints = joints
+        handle._trajectory, handle._velocities = self.planner.plan_scurve(joints, start, end, start_vel, vias, handle.duration)
+        handle._step = 0
+        handle.status = "running"
+        self._active.append(handle)
+
+        for old in preempted: self._cancel_chain_locked(old)
+
+    def _cancel_chain(self, handle):
+        with self._lock:
+            self._cancel_chain_locked(handle)
+
+    def _cancel_chain_locked(self, handle):
+        # 找到链头，整条链 (含未开始的后续) 一起取消
+        root = handle
+        while root._parent is not None and root._parent.status in ("pending", "running"):
+            root = root._parent
+        pending = [root]
+        finished = []
+        while pending:
+            h = pending.pop()
+            pending.extend(h._children)
+            h._children = []
+            if h.status in ("pending", "running"):
+                if h in self._active: self._active.remove(h)
+                finished.append(h)
+        # 被取消且无人接管的关节就地停住
+        owned = {id for h in self._active for id in h._joints}
+        for h in finished:
+            for id in h._joints:
+                if id not in owned: self.velocity[id] = 0.0
+            h._finish("cancelled")
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self.running:
+            with self._lock:
+                idle = not self._active
+            if idle:
+                # 没有动作时不占用总线，等待新目标
+                self._wake.wait(0.5)
+                self._wake.clear()
+                next_tick = time.monotonic()
+                continue
+
+            targets = {}
+            completed = []
+            now = time.monotonic()
+            with self._lock:
+                for handle in list(self._active):
+                    traj = handle._trajectory
+                    if handle._step < len(traj):
+                        row = traj[handle._step]
+                        vel = handle._velocities[handle._step]
+                        handle._step += 1
+                        for id, pos, v in zip(handle._joints, row, vel):
+                            self.commanded[id] = float(pos)
+                            self.velocity[id] = float(v)
+                            targets[id] = (pos, 0) # 0 表示速度/时间由我们在外部控制
+                        if handle._step == len(traj):
+                            handle._hold_until = now + handle.dwell
+                    elif now >= handle._hold_until:
+                        self._active.remove(handle)
+                        completed.append(handle)
+
+                # 完成与接续在同一个临界区内: 期间发出的新命令只会排在后续动作之后
+                for handle in completed:
+                    children, handle._children = handle._children, []
+                    handle._finish("done")
+                    for child in children: self._start_locked(child)
+
+            if targets:
+                try: self.driver.sync_write_positions(targets)
+                except Exception as e: print(f"Servo Error: {e}")
+
+            # 严格控制循环频率 [cite: 148]
+            next_tick += self.dt
+            delay = next_tick - time.monotonic()
+            if delay > 0: time.sleep(delay)
+            else: next_tick = time.monotonic() # 落后太多则重新对齐，不追帧
@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import config
+
+class MotionGate:
+    """
+    检测前的廉价运动门控
+    - 画面缩小到 MOTION_GATE_WIDTH 宽、转灰度后与滑动平均背景做差分
+    - 变化像素比例超过 MOTION_MIN_AREA 视为有运动，返回运动区域 (原图坐标)
+    - 画面静止时由调用方跳过 YOLO；有运动时可以只把运动区域送进检测器
+    """
+    def __init__(self):
+        self.background = None
+        self.scale = 1.0
+        self.motion_ratio = 0.0 # 最近一帧变化像素占比
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+    def update(self, frame):
+        """处理一帧，返回运动区域 [(x, y, w, h), ...] (原图像素，空列表表示静止)"""
+        h, w = frame.shape[:2]
+        self.scale = config.MOTION_GATE_WIDTH / w
+        small = cv2.resize(frame, (config.MOTION_GATE_WIDTH, max(1, int(round(h * self.scale)))), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0).astype(np.float32)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray
+            self.motion_ratio = 0.0
+            return []
+
+        diff = cv2.absdiff(gray, self.background)
+        # 背景慢慢跟上光照变化；静止下来的人几秒后并入背景 (由跟踪器和定期检测兜底)
+        cv2.accumulateWeighted(gray, self.background, config.MOTION_BG_ALPHA)
+
+        mask = (diff > config.MOTION_THRESHOLD).astype(np.uint8)
+        self.motion_ratio = float(mask.mean())
+        if self.motion_ratio < config.MOTION_MIN_AREA:
+            return []
+
+        mask = cv2.dilate(mask, self._kernel, iterations=2)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        min_pixels = config.MOTION_MIN_AREA * mask.size
+        regions = []
+        for x, y, bw, bh, area in stats[1:count]:
+            if area < min_pixels: continue
+            regions.append((x / self.scale, y / self.scale, bw / self.scale, bh / self.scale))
+        return regions
+
+
+def crop_region(boxes, frame_shape, pad, max_area):
+    """
+    把若干框 (运动区域 + 跟踪目标) 合并成一个裁剪框 (x0, y0, x1, y1)
+    外扩 pad (按框尺寸比例)；合并后超过画面 max_area 比例时返回 None (直接用整幅画面)
+    """
+    if not boxes: return None
+    h, w = frame_shape[:2]
+    boxes = np.asarray(boxes, dtype=np.float64)
+    x0, y0 = boxes[:, 0].min(), boxes[:, 1].min()
+    x1, y1 = (boxes[:, 0] + boxes[:, 2]).max(), (boxes[:, 1] + boxes[:, 3]).max()
+    px, py = (x1 - x0) * pad, (y1 - y0) * pad
+    x0, y0 = int(max(0, x0 - px)), int(max(0, y0 - py))
+    x1, y1 = int(min(w, x1 + px)), int(min(h, y1 + py))
+    if x1 <= x0 or y1 <= y0: return None
+    if (x1 - x0) * (y1 - y0) > max_area * w * h: return None
+    return x0, y0, x1, y1
@@ -1,49 +1,296 @@
-import time
 import math
 import numpy as np
+from functools import lru_cache
+
+class DoubleSProfile:
+    """
+    单关节 Double-S (七段式、加加速度受限) 轨迹
+    参考 Biagiotti & Melchiorri《Trajectory Planning for Automatic Machines and Robots》3.4 节
+    支持非零起止速度 (起止加速度为 0)；内部统一在正方向 (sigma 变换后) 求解
+    """
+    def __init__(self, sigma, q0, q1, v0, v1, vlim, jmax, Tj1, Ta, Tv, Tj2, Td):
+        self.sigma = sigma
+        self.q0, self.q1, self.v0, self.v1, self.vlim, self.jmax = q0, q1, v0, v1, vlim, jmax
+        self.Tj1, self.Ta, self.Tv, self.Tj2, self.Td = Tj1, Ta, Tv, Tj2, Td
+        self.alim_a = jmax * Tj1
+        self.alim_d = -jmax * Tj2
+        self.time_scale = 1.0 # >1 表示按时间拉伸播放 (同步兜底)
+
+    @property
+    def duration(self):
+        return (self.Ta + self.Tv + self.Td) * self.time_scale
+
+    @property
+    def end_pos(self):
+        return self.sigma * self.q1
+
+    @property
+    def end_vel(self):
+        return self.sigma * self.v1 / self.time_scale
+
+    @staticmethod
+    def feasible(h, v0, v1, amax, jmax):
+        """位移 h 是否足够在加加速度限制下把速度从 v0 变到 v1"""
+        Tj = min(math.sqrt(abs(v1 - v0) / jmax), amax / jmax)
+        if Tj < amax / jmax:
+            return h >= Tj * (v0 + v1) - 1e-9
+        return h >= 0.5 * (v0 + v1) * (Tj + abs(v1 - v0) / amax) - 1e-9
+
+    @classmethod
+    def solve(cls, q0, q1, v0, v1, vmax, amax, jmax):
+        """时间最优解 (调用方需保证 feasible)"""
+        sigma = 1.0 if q1 > q0 or (q1 == q0 and v0 + v1 >= 0) else -1.0
+        q0, q1, v0, v1 = sigma * q0, sigma * q1, sigma * v0, sigma * v1
+        h = q1 - q0
+        vmax = max(vmax, abs(v0), abs(v1))
+
+        # 情况 1: 能达到 vmax
+        if (vmax - v0) * jmax < amax ** 2:
+            Tj1 = math.sqrt((vmax - v0) / jmax); Ta = 2 * Tj1
+        else:
+            Tj1 = amax / jmax; Ta = Tj1 + (vmax - v0) / amax
+        if (vmax - v1) * jmax < amax ** 2:
+            Tj2 = math.sqrt((vmax - v1) / jmax); Td = 2 * Tj2
+        else:
+            Tj2 = amax / jmax; Td = Tj2 + (vmax - v1) / amax
+        Tv = h / vmax - Ta / 2 * (1 + v0 / vmax) - Td / 2 * (1 + v1 / vmax)
+
+        if Tv <= 0:
+            # 情况 2: 达不到 vmax，逐步降低加速度直到存在匀加速段
+            Tv = 0.0
+            a = amax
+            while True:
+                Tj = a / jmax
+                Tj1 = Tj2 = Tj
+                delta = a ** 4 / jmax ** 2 + 2 * (v0 ** 2 + v1 ** 2) + a * (4 * h - 2 * a / jmax * (v0 + v1))
+                root = math.sqrt(max(delta, 0.0))
+                Ta = (a * a / jmax - 2 * v0 + root) / (2 * a)
+                Td = (a * a / jmax - 2 * v1 + root) / (2 * a)
+                if Ta < 0:
+                    # 只有减速段
+                    Ta = Tj1 = 0.0
+                    Td = 2 * h / (v1 + v0)
+                    Tj2 = (jmax * h - math.sqrt(max(jmax * (jmax * h * h + (v1 + v0) ** 2 * (v1 - v0)), 0.0))) / (jmax * (v1 + v0))
+                    break
+                if Td < 0:
+                    # 只有加速段
+                    Td = Tj2 = 0.0
+                    Ta = 2 * h / (v1 + v0)
+                    Tj1 = (jmax * h - math.sqrt(max(jmax * (jmax * h * h - (v1 + v0) ** 2 * (v1 - v0)), 0.0))) / (jmax * (v1 + v0))
+                    break
+                if (Ta >= 2 * Tj and Td >= 2 * Tj) or a < 1e-6 * amax:
+                    break
+                a *= 0.97
+
+        vlim = v0 + (Ta - Tj1) * jmax * Tj1
+        return cls(sigma, q0, q1, v0, v1, vlim, jmax, Tj1, Ta, Tv, Tj2, Td)
+
+    @classmethod
+    def stop(cls, q0, v0, amax, jmax):
+        """从速度 v0 以最短时间刹停 (只有减速段)"""
+        sigma = 1.0 if v0 >= 0 else -1.0
+        v = abs(v0)
+        if v * jmax < amax ** 2:
+            Tj = math.sqrt(v / jmax); Td = 2 * Tj
+        else:
+            Tj = amax / jmax; Td = Tj + v / amax
+        q0 = sigma * q0
+        return cls(sigma, q0, q0 + v * Td / 2, v, 0.0, v, jmax, 0.0, 0.0, 0.0, Tj, Td)
+
+    def sample(self, t):
+        """在时间数组 t (相对本段起点) 上采样，返回 (位置, 速度)"""
+        t = np.clip(np.asarray(t, dtype=float) / self.time_scale, 0.0, self.Ta + self.Tv + self.Td)
+        q0, q1, v0, v1, vlim, j = self.q0, self.q1, self.v0, self.v1, self.vlim, self.jmax
+        Tj1, Ta, Tv, Tj2, Td = self.Tj1, self.Ta, self.Tv, self.Tj2, self.Td
+        T = Ta + Tv + Td
+        tau = t - T + Td # 减速段内的时间
+        conds = [t < Tj1, t < Ta - Tj1, t < Ta, t < Ta + Tv, t < T - Td + Tj2, t < T - Tj2]
+        pos = np.select(conds, [
+            q0 + v0 * t + j * t ** 3 / 6,
+            q0 + v0 * t + self.alim_a / 6 * (3 * t ** 2 - 3 * Tj1 * t + Tj1 ** 2),
+            q0 + (vlim + v0) * Ta / 2 - vlim * (Ta - t) + j * (Ta - t) ** 3 / 6,
+            q0 + (vlim + v0) * Ta / 2 + vlim * (t - Ta),
+            q1 - (vlim + v1) * Td / 2 + vlim * tau - j * tau ** 3 / 6,
+            q1 - (vlim + v1) * Td / 2 + vlim * tau + self.alim_d / 6 * (3 * tau ** 2 - 3 * Tj2 * tau + Tj2 ** 2),
+        ], q1 - v1 * (T - t) - j * (T - t) ** 3 / 6)
+        vel = np.select(conds, [
+            v0 + j * t ** 2 / 2,
+            v0 + self.alim_a * (t - Tj1 / 2),
+            vlim - j * (Ta - t) ** 2 / 2,
+            np.full_like(t, vlim),
+            vlim - j * tau ** 2 / 2,
+            vlim + self.alim_d * (tau - Tj2 / 2),
+        ], v1 + j * (T - t) ** 2 / 2)
+        return self.sigma * pos, self.sigma * vel / self.time_scale
+
+
+def _plan_joint(q0, q1, v0, v1, vmax, amax, jmax, min_duration=0.0):
+    """
+    单关节分段规划: 反向运动或位移不够减速时先刹停，再走 Double-S
+    min_duration > 最短时间时，降低 vmax 拉伸主段以实现多关节同步
+    先刹停再出发的情况下总时长可能超过 min_duration，调用方须按实际时长重新同步
+    返回分段列表
+    """
+    segments = []
+    sigma = 1.0 if q1 >= q0 else -1.0
+    if sigma * v1 < 0 or q0 == q1:
+        v1 = 0.0 # 终点速度必须与位移同向
+    if sigma * v0 < 0 or not DoubleSProfile.feasible(sigma * (q1 - q0), sigma * v0, sigma * v1, amax, jmax):
+        stop = DoubleSProfile.stop(q0, v0, amax, jmax)
+        segments.append(stop)
+        q0, v0 = stop.end_pos, 0.0
+        sigma = 1.0 if q1 >= q0 else -1.0
+        if not DoubleSProfile.feasible(sigma * (q1 - q0), 0.0, sigma * v1, amax, jmax):
+            v1 = 0.0 # 途经点速度只是建议值，做不到就停在途经点
+
+    if q0 == q1 and v0 == 0 and v1 == 0:
+        return segments
+
+    target = min_duration - sum(seg.duration for seg in segments)
+    main = DoubleSProfile.solve(q0, q1, v0, v1, vmax, amax, jmax)
+    if 0 < main.duration < target:
+        if v0 == 0 and v1 == 0:
+            # 起止静止: 时间缩放是精确解，速度/加速度/加加速度只会变小
+            main.time_scale = target / main.duration
+        else:
+            lo, hi = max(abs(v0), abs(v1), 1e-3), vmax
+            slowest = DoubleSProfile.solve(q0, q1, v0, v1, lo, amax, jmax)
+            if slowest.duration > target:
+                # 二分降低 vmax，直到时长对齐
+                for _ in range(30):
+                    mid = 0.5 * (lo + hi)
+                    candidate = DoubleSProfile.solve(q0, q1, v0, v1, mid, amax, jmax)
+                    if candidate.duration > target: lo = mid
+                    else: hi = mid; main = candidate
+            elif v0 != 0:
+                # 降速也填不满: 先刹停再从静止出发
+                stop = DoubleSProfile.stop(q0, v0, amax, jmax)
+                return segments + [stop] + _plan_joint(stop.end_pos, q1, 0.0, v1, vmax, amax, jmax, target - stop.duration)
+            else:
+                main = slowest
+                main.time_scale = target / main.duration # 兜底: 起止速度会被等比缩小
+    segments.append(main)
+    return segments
+
 
 class MotionPlanner:
     """
-    基于 PDF Section 4.3 的 S-Curve (Sigmoid) 平滑运动规划器
-    用于生成符合生物运动特征的舵机轨迹，消除机械顿挫感。
+    多关节 Double-S 轨迹规划器 (按 config.JOINT_LIMITS 中每个关节的速度/加速度/加加速度限制)
+    轨迹只取决于相对起点的位移: 缓存按 "相对起点的偏移 + 起始速度" 建键，规划结果平移到实际起点
+    相对当前姿态的手势 (点头) 和从静止出发的动作链不管从哪个姿态出发都命中缓存
     """
-    def __init__(self, frequency=50):
+    DEFAULT_LIMITS = {"vmax": 1000.0, "amax": 4000.0, "jmax": 30000.0}
+
+    def __init__(self, frequency=50, limits=None):
         self.freq = frequency # 控制频率 50Hz (20ms周期) [cite: 94]
         self.dt = 1.0 / frequency
+        self.limits = limits or {} # {关节ID: {"vmax", "amax", "jmax"}}
+        self._plan_cached = lru_cache(maxsize=64)(self._plan_scurve)
 
-    def calculate_sigmoid_trajectory(self, start_pos, end_pos, duration=None, max_velocity=None):
+    def plan_scurve(self, joints, start_pos, end_pos, start_vel=None, vias=None, duration=None):
         """
-        生成从 start_pos 到 end_pos 的 S 型轨迹点 [cite: 96]
+        多关节时间最优、时间同步的 Double-S 轨迹
+        joints: 关节 ID 列表 (用于查 self.limits)
+        start_vel: 起始速度 (从正在执行的动作衔接时非零)
+        vias: 途经点列表，每个元素为各关节位置
+        duration: 期望的最短总时长 (None 表示按硬件极限尽快完成)
+        返回 (位置, 速度)，shape 均为 (N, n_axes)，只读 (速度可能与其他调用共享缓存)
+        规划失败时打印原因并返回就地刹停的轨迹，不抛异常 (在执行器的锁内调用)
         """
-        distance = end_pos - start_pos
-        
-        # 如果距离极小，直接返回目标点，避免计算开销 [cite: 105]
-        if abs(distance) < 0.1:
-            yield end_pos
-            return
-
-        # 自动计算持续时间
-        if duration is None:
-            if max_velocity is None:
-                max_velocity = 120.0 # 默认最大速度
-            # 引入 heuristic: 2.0 是 S 曲线相对于线性运动的时间膨胀系数 [cite: 114]
-            duration = (abs(distance) / max_velocity) * 2.0
-            duration = max(duration, 0.5) # 最少 0.5 秒，保证动作可见 [cite: 115]
-
-        steps = int(duration * self.freq)
-        
-        # Sigmoid 核心映射: x 域从 -6 到 6 [cite: 124]
-        # 这覆盖了 Logistic 曲线 0.002 到 0.998 的范围，实现“慢进慢出” [cite: 159]
-        for step in range(steps + 1):
-            progress = step / steps
-            x = (progress * 12.0) - 6.0
-            
-            # Logistic 函数: f(x) = 1 / (1 + e^-x) [cite: 126]
-            try:
-                sigmoid_factor = 1.0 / (1.0 + math.exp(-x))
-            except OverflowError:
-                sigmoid_factor = 1.0 if x > 0 else 0.0
-
-            # 映射回角度 [cite: 128]
-            current_pos = start_pos + (distance * sigmoid_factor)
-            yield current_pos
+        origin = np.atleast_1d(np.asarray(start_pos, dtype=float))
+        # 键取到 1e-6 tick: 衔接时的浮点误差不影响命中，终点误差远小于舵机分辨率
+        offset = lambda p: tuple(round(float(x), 6) for x in np.atleast_1d(p) - origin)
+        vel = None if start_vel is None else tuple(round(float(v), 6) for v in np.atleast_1d(start_vel))
+        try:
+            plan = self._plan_cached(tuple(joints), offset(end_pos), vel, tuple(offset(v) for v in vias or []), duration)
+        except Exception as e:
+            print(f"⚠️ 轨迹规划失败: {e}")
+            plan = None
+        if plan is None:
+            print("⚠️ 改为就地刹停")
+            return self._plan_stop(joints, origin, start_vel)
+        positions = plan[0] + origin
+        positions.setflags(write=False)
+        return positions, plan[1]
+
+    def _plan_stop(self, joints, start_pos, start_vel):
+        """兜底: 各关节从起始速度按加加速度限制刹停 (静止时原地保持一个周期)"""
+        n = len(joints)
+        lims = [self.limits.get(id, self.DEFAULT_LIMITS) for id in joints]
+        vel = np.zeros(n) if start_vel is None else np.asarray(start_vel, dtype=float)
+        stops = [DoubleSProfile.stop(start_pos[j], vel[j], lims[j]["amax"], lims[j]["jmax"]) if vel[j] else None
+                 for j in range(n)]
+        total = max([stop.duration for stop in stops if stop] + [0.0])
+        steps = max(int(math.ceil(total / self.dt - 1e-9)), 1)
+        t = np.minimum(np.arange(1, steps + 1) * self.dt, total)
+        positions = np.tile(np.asarray(start_pos, dtype=float), (steps, 1))
+        velocities = np.zeros((steps, n))
+        for j, stop in enumerate(stops):
+            if stop: positions[:, j], velocities[:, j] = stop.sample(t)
+        positions.setflags(write=False)
+        velocities.setflags(write=False)
+        return positions, velocities
+
+    def _plan_scurve(self, joints, end_pos, start_vel, vias, duration):
+        """在以起点为原点的坐标里规划 (结果被缓存)，终点不连续时返回 None"""
+        n = len(joints)
+        waypoints = [np.zeros(n)] + [np.asarray(p, dtype=float) for p in list(vias) + [end_pos]]
+        lims = [self.limits.get(id, self.DEFAULT_LIMITS) for id in joints]
+        vel = np.zeros(n) if start_vel is None else np.asarray(start_vel, dtype=float)
+
+        # 1. 先按途经点静止估计每段时长
+        estimates = []
+        for k in range(len(waypoints) - 1):
+            seg_T = [sum(seg.duration for seg in _plan_joint(waypoints[k][j], waypoints[k + 1][j], 0.0, 0.0, **lims[j]))
+                     for j in range(n)]
+            estimates.append(max(seg_T + [1e-6]))
+        stretch = 1.0
+        if duration is not None and sum(estimates) > 0:
+            stretch = max(1.0, duration / sum(estimates))
+
+        # 2. 途经点速度: 相邻两段平均斜率，方向反转处取 0
+        via_vel = [np.zeros(n) for _ in waypoints]
+        for k in range(1, len(waypoints) - 1):
+            before = (waypoints[k] - waypoints[k - 1]) / estimates[k - 1]
+            after = (waypoints[k + 1] - waypoints[k]) / estimates[k]
+            v = np.where(np.sign(before) == np.sign(after), 0.5 * (before + after), 0.0)
+            via_vel[k] = np.clip(v, [-l["vmax"] for l in lims], [l["vmax"] for l in lims])
+
+        # 3. 逐段规划: 各关节取最短时间，再按最慢关节同步
+        timeline = [[] for _ in range(n)] # 每个关节: [(起始时间, 段)]
+        t0 = 0.0
+        for k in range(len(waypoints) - 1):
+            q0, q1 = waypoints[k], waypoints[k + 1]
+            fastest = [_plan_joint(q0[j], q1[j], vel[j], via_vel[k + 1][j], **lims[j]) for j in range(n)]
+            seg_T = max([sum(seg.duration for seg in segs) for segs in fastest] + [estimates[k] * stretch if stretch > 1 else 0.0])
+            # 拉伸后的实际时长可能超过 seg_T (先刹停再出发比直接走更久)，按实际最长的重新同步
+            for _ in range(10):
+                plans = [_plan_joint(q0[j], q1[j], vel[j], via_vel[k + 1][j], min_duration=seg_T, **lims[j]) for j in range(n)]
+                actual = max(sum(seg.duration for seg in segs) for segs in plans)
+                if actual <= seg_T + 1e-9: break
+                seg_T = actual
+            for j, segs in enumerate(plans):
+                t = t0
+                for seg in segs:
+                    timeline[j].append((t, seg))
+                    t += seg.duration
+                vel[j] = segs[-1].end_vel if segs else 0.0
+            t0 += seg_T
+
+        # 4. 按控制周期采样 (从第一个 tick 开始，最后一个点精确到位)
+        steps = max(int(math.ceil(t0 / self.dt - 1e-9)), 1)
+        t = np.minimum(np.arange(1, steps + 1) * self.dt, t0)
+        positions = np.tile(waypoints[0], (steps, 1))
+        velocities = np.zeros((steps, n))
+        for j in range(n):
+            for start, seg in timeline[j]:
+                mask = t >= start
+                if not mask.any(): continue
+                positions[mask, j], velocities[mask, j] = seg.sample(t[mask] - start)
+        # 各关节分段首尾相接、按同一时长对齐，最后一个采样应当静止落在终点上
+        if not (np.allclose(positions[-1], waypoints[-1], atol=1e-6) and np.allclose(velocities[-1], 0.0, atol=1e-6)):
+            print(f"⚠️ 轨迹未连续到达终点: {positions[-1]} != {waypoints[-1]} (速度 {velocities[-1]})")
+            return None
+        positions.setflags(write=False)
+        velocities.setflags(write=False)
+        return positions, velocities
@@ -0,0 +1,198 @@
+import threading
+import numpy as np
+import config
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+def iou_matrix(boxes_a, boxes_b):
+    """两组 (x, y, w, h) 框两两之间的 IoU，返回 (len(a), len(b))"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    ih = np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+def associate(iou, threshold):
+    """
+    按 IoU 做一对一匹配，返回 [(轨迹下标, 检测下标), ...]
+    有 scipy 时用匈牙利算法，否则按 IoU 从大到小贪心
+    """
+    if iou.size == 0: return []
+    if SCIPY_AVAILABLE:
+        rows, cols = linear_sum_assignment(-iou)
+        pairs = zip(rows, cols)
+    else:
+        order = np.dstack(np.unravel_index(np.argsort(-iou, axis=None), iou.shape))[0]
+        used_r, used_c, pairs = set(), set(), []
+        for r, c in order:
+            if r in used_r or c in used_c: continue
+            used_r.add(r); used_c.add(c)
+            pairs.append((r, c))
+    return [(int(r), int(c)) for r, c in pairs if iou[r, c] >= threshold]
+
+
+class Track:
+    """
+    单个目标的卡尔曼滤波器 (匀速模型)
+    状态: [cx, cy, w, h, vx, vy]，单位像素 / 像素每秒；时间用画面采集时刻 (time.monotonic)
+    """
+    _next_id = 1
+
+    def __init__(self, box, score, t):
+        x, y, w, h = box
+        self.id = Track._next_id
+        Track._next_id += 1
+        self.x = np.array([x + w / 2, y + h / 2, w, h, 0.0, 0.0])
+        r = config.TRACK_MEAS_NOISE ** 2
+        self.P = np.diag([r, r, r, r, 200.0 ** 2, 200.0 ** 2]) # 初始速度未知
+        self.time = t # 滤波器状态对应的时刻
+        self.last_seen = t
+        self.hits = 1
+        self.score = float(score)
+
+    @property
+    def confirmed(self):
+        return self.hits >= config.TRACK_MIN_HITS
+
+    def _transition(self, dt):
+        F = np.eye(6)
+        F[0, 4] = F[1, 5] = dt
+        q = config.TRACK_ACCEL_NOISE ** 2
+        # 加速度白噪声驱动位置/速度；宽高按随机游走
+        G = np.zeros((6, 2))
+        G[0, 0] = G[1, 1] = dt * dt / 2
+        G[4, 0] = G[5, 1] = dt
+        Q = q * G @ G.T
+        Q[2, 2] = Q[3, 3] = (config.TRACK_SIZE_NOISE * max(dt, 1e-3)) ** 2
+        return F, Q
+
+    def predict(self, t):
+        """把状态推进到时刻 t (原地更新)"""
+        dt = t - self.time
+        if dt <= 0: return
+        F, Q = self._transition(dt)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+        self.time = t
+
+    def peek(self, t):
+        """不改变状态，返回时刻 t 的预测 (cx, cy, w, h, vx, vy)"""
+        dt = max(0.0, t - self.time)
+        x = self.x.copy()
+        x[0] += x[4] * dt
+        x[1] += x[5] * dt
+        return x
+
+    def update(self, box, score, t):
+        self.predict(t)
+        x, y, w, h = box
+        z = np.array([x + w / 2, y + h / 2, w, h])
+        H = np.eye(4, 6)
+        R = np.eye(4) * config.TRACK_MEAS_NOISE ** 2
+        S = H @ self.P @ H.T + R
+        K = self.P @ H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - H @ self.x)
+        self.P = (np.eye(6) - K @ H) @ self.P
+        self.last_seen = t
+        self.hits += 1
+        self.score = float(score)
+
+    def box(self, t=None):
+        cx, cy, w, h = (self.x if t is None else self.peek(t))[:4]
+        return (cx - w / 2, cy - h / 2, w, h)
+
+
+class MultiObjectTracker:
+    """
+    检测结果之上的多目标跟踪层
+    - 每次检测后: 把所有轨迹预测到画面采集时刻，按 IoU 匹配 (匈牙利 / 贪心)，更新卡尔曼滤波
+    - 没有跑检测的帧: predict(t) 直接外推，给控制回路逐帧的平滑目标
+    - 轨迹 ID 稳定；锁定的主目标只要还活着就不换人
+    - 相机自身会转动: 设置 ego_motion 后滤波在 "底座坐标" 下进行 (画面坐标 - 自身转动造成的位移)，
+      速度是目标真实的运动速度，不会把相机自己的转动当成目标在动；对外的位置仍是画面坐标
+    """
+    def __init__(self):
+        self.tracks = []
+        self.target_id = None
+        self.ego_motion = None # 可选: t -> (dx, dy)，时刻 t 相机自身转动造成的画面累计位移 (像素)
+        self._lock = threading.Lock()
+
+    def _shift(self, t):
+        if self.ego_motion is None: return np.zeros(2)
+        return np.asarray(self.ego_motion(t), dtype=float)
+
+    def update(self, detections, t):
+        """detections: DETECTION_DTYPE 数组；t: 该帧的采集时刻。返回当前主目标 Track (底座坐标) 或 None"""
+        boxes = np.stack([detections["x"], detections["y"], detections["w"], detections["h"]], axis=1) if len(detections) else np.empty((0, 4))
+        if len(boxes): boxes[:, :2] -= self._shift(t)
+        with self._lock:
+            for track in self.tracks: track.predict(t)
+            iou = iou_matrix([track.box() for track in self.tracks], boxes)
+            matches = associate(iou, config.TRACK_IOU_THRESHOLD)
+
+            matched = set()
+            for ti, di in matches:
+                self.tracks[ti].update(boxes[di], detections["score"][di], t)
+                matched.add(di)
+            for di in range(len(boxes)):
+                if di not in matched:
+                    self.tracks.append(Track(boxes[di], detections["score"][di], t))
+
+            # 未确认的轨迹一次没匹配上就删 (多半是误检)；已确认的允许丢失 TRACK_MAX_AGE 秒
+            self.tracks = [track for track in self.tracks
+                           if track.last_seen == t or (track.confirmed and t - track.last_seen <= config.TRACK_MAX_AGE)]
+            return self._select_target()
+
+    def _select_target(self):
+        alive = {track.id: track for track in self.tracks if track.confirmed}
+        if self.target_id in alive: return alive[self.target_id]
+        # 原目标丢失: 换成面积最大的已确认目标
+        if not alive:
+            self.target_id = None
+            return None
+        best = max(alive.values(), key=lambda track: track.x[2] * track.x[3])
+        self.target_id = best.id
+        return best
+
+    def predict(self, t):
+        """
+        所有已确认轨迹在时刻 t 的预测，[{id, box, velocity, age}, ...]
+        age: 距离上次被检测到的时间 (秒)
+        """
+        dx, dy = self._shift(t)
+        with self._lock:
+            out = []
+            for track in self.tracks:
+                if not track.confirmed or t - track.last_seen > config.TRACK_MAX_AGE: continue
+                state = track.peek(t)
+                x, y, w, h = track.box(t)
+                out.append({"id": track.id, "box": (x + dx, y + dy, w, h), "velocity": (state[4], state[5]),
+                            "age": t - track.last_seen})
+            return out
+
+    def predict_target(self, t):
+        """
+        主目标在时刻 t 的预测: 画面中心 (cx, cy) 和真实运动速度 (vx, vy，像素/秒，不含相机自身转动)
+        没有主目标返回 None
+        """
+        dx, dy = self._shift(t)
+        with self._lock:
+            for track in self.tracks:
+                if track.id == self.target_id:
+                    if t - track.last_seen > config.TRACK_MAX_AGE: return None
+                    state = track.peek(t)
+                    return (state[0] + dx, state[1] + dy), (state[4], state[5])
+        return None
+
+    def reset(self):
+        with self._lock:
+            self.tracks = []
+            self.target_id = None
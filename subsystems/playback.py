@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+import config
+
+class JitterBuffer:
+    """
+    扬声器侧的抖动缓冲 (int16 单声道环形缓冲区)
+    - 网络线程 write() 写入，声卡回调 read() 按硬件节奏取出，两边互不阻塞
+    - 目标缓冲深度按网络包到达间隔的均值 + PLAYBACK_JITTER_K 倍标准差自适应
+    - 缓冲攒够目标深度 (或等够目标时长) 才开始出声，中途播空再重新缓冲
+    - 云端常常比实时更快地下发整段回复，积压的是正常内容，只有环形缓冲区写满时才丢最旧的音频
+    - 记录最近实际送给声卡的音频能量，作为回声抑制的参考信号
+    """
+    def __init__(self, rate, seconds=10.0):
+        self.rate = rate
+        self.size = int(rate * seconds)
+        self.buffer = np.zeros(self.size, dtype=np.int16)
+        self._lock = threading.Lock()
+        self._read = 0 # 绝对样本序号
+        self._write = 0
+        self.playing = False
+
+        self._last_arrival = None
+        self._gap_mean = config.PLAYBACK_MIN_BUFFER
+        self._gap_var = 0.0
+        self.target = config.PLAYBACK_MIN_BUFFER # 目标缓冲深度 (秒)
+        self._first_buffered = None
+        self._drained_at = None
+
+        self.underruns = 0 # 播放中途缓冲被播空 (之后又来了数据)
+        self.overruns = 0  # 缓冲区写满而丢弃旧音频的次数
+        self.device_underflows = 0 # 声卡报告的输出欠载
+
+        self.history = deque(maxlen=200) # (送出时刻, RMS)，每次回调一条，约最近几秒
+        self.last_played = 0.0 # 最近一次送出非静音的时刻
+
+    def depth(self):
+        """当前缓冲的音频时长 (秒)"""
+        return (self._write - self._read) / self.rate
+
+    def write(self, pcm):
+        pcm = np.asarray(pcm, dtype=np.int16)
+        now = time.monotonic()
+        with self._lock:
+            self._track_arrival(now)
+            if self._drained_at is not None and now - self._drained_at < 0.5:
+                self.underruns += 1 # 刚播空就又来了数据: 说明是中途断粮，不是一句话说完
+            self._drained_at = None
+
+            n = len(pcm)
+            if n > self.size: pcm, n = pcm[-self.size:], self.size
+            # 写满: 丢最旧的
+            if self._write - self._read + n > self.size:
+                self._read = self._write + n - self.size
+                self.overruns += 1
+
+            start = self._write % self.size
+            end = start + n
+            if end <= self.size:
+                self.buffer[start:end] = pcm
+            else:
+                split = self.size - start
+                self.buffer[start:] = pcm[:split]
+                self.buffer[:n - split] = pcm[split:]
+            self._write += n
+            if self._first_buffered is None: self._first_buffered = now
+
+    def _track_arrival(self, now):
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            if gap < 1.0: # 超过 1 秒的间隔是两轮对话之间，不算网络抖动
+                delta = gap - self._gap_mean
+                self._gap_mean += 0.1 * delta
+                self._gap_var = 0.9 * (self._gap_var + 0.1 * delta * delta)
+                target = self._gap_mean + config.PLAYBACK_JITTER_K * self._gap_var ** 0.5
+                self.target = min(config.PLAYBACK_MAX_BUFFER, max(config.PLAYBACK_MIN_BUFFER, target))
+        self._last_arrival = now
+
+    def read(self, n):
+        """声卡回调取 n 个样本 (bytes)；缓冲中或播空时补静音"""
+        out = np.zeros(n, dtype=np.int16)
+        now = time.monotonic()
+        with self._lock:
+            available = self._write - self._read
+            if not self.playing:
+                if available == 0 or (available < self.target * self.rate and now - self._first_buffered < self.target):
+                    self.history.append((now, 0.0))
+                    return out.tobytes()
+                self.playing = True
+
+            take = min(n, available)
+            start = self._read % self.size
+            end = start + take
+            if end <= self.size:
+                out[:take] = self.buffer[start:end]
+            else:
+                split = self.size - start
+                out[:split] = self.buffer[start:]
+                out[split:take] = self.buffer[:take - split]
+            self._read += take
+
+            if self._read == self._write:
+                # 播空: 重新进入缓冲状态
+                self.playing = False
+                self._first_buffered = None
+                self._drained_at = now
+        if take:
+            self.last_played = now
+            self.history.append((now, float(np.sqrt(np.mean(np.square(out, dtype=np.float32)))) / 32768.0))
+        else:
+            self.history.append((now, 0.0))
+        return out.tobytes()
+
+    def reference_level(self, t0, t1):
+        """[t0, t1] 时间段内送给声卡的音频的最大 RMS (0~1)"""
+        return max((rms for t, rms in list(self.history) if t0 <= t <= t1), default=0.0)
+
+    def recently_played(self, window=0.3):
+        return self.depth() > 0 or time.monotonic() - self.last_played < window
+
+    def clear(self):
+        """丢弃所有待播音频 (打断)"""
+        with self._lock:
+            self._read = self._write
+            self.playing = False
+            self._first_buffered = None
+            self._drained_at = None
+
+    def stats(self):
+        return {"depth_ms": round(self.depth() * 1000), "target_ms": round(self.target * 1000),
+                "jitter_ms": round(self._gap_var ** 0.5 * 1000, 1),
+                "underruns": self.underruns, "overruns": self.overruns,
+                "device_underflows": self.device_underflows}
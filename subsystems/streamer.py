@@ -0,0 +1,149 @@
+import time
+import threading
+import cv2
+import config
+
+try:
+    from turbojpeg import TurboJPEG
+    _turbo = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except Exception:
+    _turbo = None
+    TURBOJPEG_AVAILABLE = False
+
+def encode_jpeg(frame, quality):
+    """JPEG 编码: 优先用 libjpeg-turbo (SIMD)，否则用 OpenCV"""
+    if _turbo is not None and config.STREAM_USE_TURBOJPEG:
+        return _turbo.encode(frame, quality=quality) # 默认 BGR 输入
+    ok, buf = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buf.tobytes() if ok else None
+
+
+class _Profile:
+    """一种画质档位 (缩放 + 质量)，同档位的客户端共享同一份编码结果"""
+    def __init__(self, scale, quality):
+        self.scale = scale
+        self.quality = quality
+        self.clients = [] # 订阅此档位的 StreamClient
+        self.seq = 0
+        self.jpeg = None
+        self.last_encode = 0.0
+
+    def max_fps(self):
+        return max(client.fps for client in self.clients)
+
+
+class StreamClient:
+    """一个网页观看者: 自带帧率上限，通过 wait_next 拿到自己档位的最新 JPEG"""
+    def __init__(self, broadcaster, profile, fps):
+        self.broadcaster = broadcaster
+        self.profile = profile
+        self.fps = fps
+        self.seq = 0
+        self._last_sent = 0.0
+
+    def wait_next(self, timeout=1.0):
+        """等待比上次更新的一帧 (并遵守本客户端的帧率上限)，超时返回 None"""
+        delay = self._last_sent + 1.0 / self.fps - time.monotonic()
+        if delay > 0: time.sleep(delay)
+        cond = self.broadcaster._cond
+        profile = self.profile
+        with cond:
+            if not cond.wait_for(lambda: profile.seq != self.seq or not self.broadcaster.running, timeout):
+                return None
+            if profile.seq == self.seq: return None
+            self.seq = profile.seq
+            self._last_sent = time.monotonic()
+            return profile.jpeg
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class JpegBroadcaster:
+    """
+    MJPEG 广播器: 摄像头每出一帧新画面，每个画质档位只编码一次，并打上序号
+    所有网页客户端在条件变量上等待下一个序号，不再各自轮询、各自编码；
+    慢客户端醒来时直接拿最新一帧，中间的帧自动跳过。
+    - 客户端可以指定缩放 / 质量 / 帧率上限 (见 /video_feed 的参数)
+    - 所有档位合计的编码帧率不超过 STREAM_MAX_ENCODE_FPS
+    - 没有客户端时完全停止编码
+    """
+    def __init__(self, vision):
+        self.vision = vision
+
+        self._cond = threading.Condition()
+        self._profiles = {} # {(scale, quality): _Profile}
+        self._tokens = 1.0 # 编码预算 (令牌桶)
+        self._last_refill = time.monotonic()
+
+        self.running = True
+        threading.Thread(target=self._encode_loop, daemon=True).start()
+
+    def subscribe(self, scale=1.0, quality=None, fps=None):
+        scale = round(max(0.1, min(1.0, scale)), 2)
+        quality = int(max(10, min(95, quality or config.STREAM_DEFAULT_QUALITY)))
+        fps = max(1.0, min(30.0, fps or config.STREAM_DEFAULT_FPS))
+        with self._cond:
+            profile = self._profiles.get((scale, quality))
+            if profile is None:
+                profile = self._profiles[(scale, quality)] = _Profile(scale, quality)
+            client = StreamClient(self, profile, fps)
+            profile.clients.append(client)
+            self._cond.notify_all() # 唤醒可能暂停中的编码线程
+        return client
+
+    def unsubscribe(self, client):
+        with self._cond:
+            profile = client.profile
+            if client in profile.clients: profile.clients.remove(client)
+            if not profile.clients: self._profiles.pop((profile.scale, profile.quality), None)
+
+    def client_count(self):
+        with self._cond:
+            return sum(len(p.clients) for p in self._profiles.values())
+
+    def _encode_loop(self):
+        vision = self.vision
+        last_seq = 0
+        while self.running:
+            # 没人看就暂停，不碰摄像头画面
+            with self._cond:
+                if not self._cond.wait_for(lambda: self._profiles or not self.running, timeout=1.0): continue
+
+            # 租用最新一帧的只读视图，编码期间采集线程不会覆盖它，无需拷贝
+            lease = vision.lease_latest_frame(after_seq=last_seq, timeout=1.0)
+            if lease is None: continue
+            with lease:
+                last_seq = lease.seq
+                self._encode_profiles(lease.frame, last_seq)
+
+    def _encode_profiles(self, frame, seq):
+        now = time.monotonic()
+        self._tokens = min(1.0 + len(self._profiles), self._tokens + (now - self._last_refill) * config.STREAM_MAX_ENCODE_FPS)
+        self._last_refill = now
+
+        with self._cond:
+            # 最久没编码的档位优先，预算不够时其余档位本帧跳过
+            due = sorted((p for p in self._profiles.values() if now - p.last_encode >= 1.0 / p.max_fps()),
+                         key=lambda p: p.last_encode)
+        for profile in due:
+            if self._tokens < 1.0: break
+            self._tokens -= 1.0
+            image = frame
+            if profile.scale < 1.0:
+                image = cv2.resize(frame, None, fx=profile.scale, fy=profile.scale, interpolation=cv2.INTER_AREA)
+            try: jpeg = encode_jpeg(image, profile.quality)
+            except Exception as e:
+                print(f"⚠️ JPEG 编码失败: {e}")
+                jpeg = None
+            if not jpeg: continue
+            with self._cond:
+                profile.jpeg = jpeg
+                profile.seq = seq
+                profile.last_encode = now
+                self._cond.notify_all()
+
+    def stop(self):
+        self.running = False
+        with self._cond: self._cond.notify_all()
@@ -0,0 +1,190 @@
+import math
+import time
+import threading
+from collections import deque
+import config
+
+class AxisPID:
+    """单轴 PID (输出为每个控制周期的步进量，单位: 舵机刻度)"""
+    def __init__(self, kp, ki, kd, deadzone, max_step):
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.deadzone = deadzone
+        self.max_step = max_step
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.prev_error = None
+
+    def update(self, error, dt, feed_forward=0.0):
+        if abs(error) < self.deadzone:
+            self.prev_error = error
+            return max(-self.max_step, min(self.max_step, feed_forward))
+        self.integral += error * dt
+        derivative = 0.0 if self.prev_error is None else (error - self.prev_error) / dt
+        self.prev_error = error
+        u = self.kp * error + self.ki * self.integral + self.kd * derivative + feed_forward
+        if abs(u) > self.max_step:
+            self.integral -= error * dt # 饱和时停止积分 (anti-windup)
+            u = math.copysign(self.max_step, u)
+        return u
+
+
+class TrackingController:
+    """
+    视觉闭环追踪: 固定频率读取主目标的卡尔曼预测 (vision.tracker)，驱动 config.ID_PAN / config.ID_TILT
+    - 每个控制周期都用预测到当前时刻的位置和速度，不再外推上一次检测的旧偏移
+    - 记录相机指令位置的历史并提供给跟踪器 (ego_motion)，滤波时扣除自身转动，速度即目标真实速度
+    - PID + 目标速度前馈
+    - 目标丢失超过 IDLE_TIMEOUT 后执行 SEARCH_* 扫视
+    - 记录 "画面采集 -> 舵机指令" 的延迟
+    """
+    def __init__(self, vision, actor, rate=None):
+        self.vision = vision
+        self.actor = actor
+        self.rate = rate or config.TRACK_RATE
+        self.dt = 1.0 / self.rate
+        self.axes = (config.ID_PAN, config.ID_TILT)
+
+        # 每周期步进同时受 MAX_SPEED 和关节 vmax 限制 (executor.stream 也会按关节限制截断)
+        max_step = [min(config.MAX_SPEED, config.JOINT_LIMITS[id]["vmax"] * self.dt) if id in config.JOINT_LIMITS else config.MAX_SPEED
+                    for id in self.axes]
+        self.pid_pan = AxisPID(config.PID_KP, config.PID_KI, config.PID_KD, config.DEADZONE, max_step[0])
+        self.pid_tilt = AxisPID(config.PID_KP, config.PID_KI, config.PID_KD, config.DEADZONE, max_step[1])
+
+        self._det_time = None       # 最近一次检测对应画面的采集时刻
+        self._target_id = None      # 正在追踪的轨迹 ID (见 MultiObjectTracker)
+        self._shifts = deque(maxlen=2 * self.rate) # (时刻, dx, dy): 相机转动造成的画面累计位移，约 2 秒
+        if vision is not None: vision.tracker.ego_motion = self.camera_shift
+        self._last_seen = time.monotonic()
+        self._search_phase = None
+        self._ignore_before = 0.0 # 让路/重置之前采集的画面不再使用
+
+        self.stats = {"mode": "idle", "loops": 0, "overruns": 0,
+                      "latency_ms": None, "latency_avg_ms": None, "latency_max_ms": None}
+        self.running = False
+
+    def start(self):
+        if self.running: return
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def get_stats(self):
+        return dict(self.stats)
+
+    def camera_shift(self, t):
+        """时刻 t 相机指令位置对应的画面累计位移 (像素)，相对 START_POSE；供跟踪器扣除自身转动"""
+        shifts = list(self._shifts)
+        if not shifts: return (0.0, 0.0)
+        for ts, dx, dy in reversed(shifts):
+            if ts <= t: return (dx, dy)
+        return shifts[0][1:]
+
+    def _record_shift(self, executor, now):
+        # 表情动作转动相机时也要记录，不只是自己下发的步进
+        dx = config.PAN_DIR * (executor.commanded[config.ID_PAN] - config.START_POSE[config.ID_PAN]) / config.TRACK_TICKS_PER_PX
+        dy = config.TILT_DIR * (executor.commanded[config.ID_TILT] - config.START_POSE[config.ID_TILT]) / config.TRACK_TICKS_PER_PX
+        self._shifts.append((now, dx, dy))
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self.running:
+            try: self.step()
+            except Exception as e: print(f"Tracking Error: {e}")
+            self.stats["loops"] += 1
+
+            next_tick += self.dt
+            delay = next_tick - time.monotonic()
+            if delay > 0: time.sleep(delay)
+            else:
+                self.stats["overruns"] += 1
+                next_tick = time.monotonic()
+
+    def step(self):
+        executor = self.actor.executor if self.actor else None
+        if executor is None or self.vision is None: return
+        now = time.monotonic()
+        self._record_shift(executor, now)
+
+        # 读取推理线程发布的最新结果 (不阻塞)；太旧的结果视为丢失
+        result = self.vision.get_latest_result()
+        frame_time, target_id = None, None
+        if result is not None and result.offset is not None and self._ignore_before <= result.frame_time and now - result.frame_time < 1.0:
+            frame_time, target_id = result.frame_time, result.target_id
+        # 主目标预测到此刻的画面位置和速度
+        prediction = self.vision.tracker.predict_target(now) if frame_time is not None else None
+
+        # 表情动作等正在使用这两个轴时让路
+        if executor.is_busy(self.axes):
+            self._reset()
+            return
+
+        if prediction is None:
+            if now - self._last_seen > config.IDLE_TIMEOUT:
+                self._search(executor)
+            else:
+                self.stats["mode"] = "lost"
+            return
+
+        (cx, cy), (vx, vy) = prediction
+        w, h = self.vision.frame_size
+        # 误差 = 画面中心 - 目标位置 (与 vision._to_offset 同号)
+        error = (w / 2 - cx, h / 2 - cy)
+        fresh = frame_time != self._det_time
+        if fresh:
+            if target_id != self._target_id:
+                # 换人了: 旧目标的积分作废
+                self._target_id = target_id
+                self.pid_pan.reset()
+                self.pid_tilt.reset()
+            self._det_time = frame_time
+        self._last_seen = now
+        self._search_phase = None
+        self.stats["mode"] = "tracking"
+
+        # 目标运动使误差以 -v 变化，前馈让相机跟上
+        ff = [config.TRACK_FF * -v * self.dt * config.TRACK_TICKS_PER_PX for v in (vx, vy)]
+        u_pan = self.pid_pan.update(error[0], self.dt, ff[0])
+        u_tilt = self.pid_tilt.update(error[1], self.dt, ff[1])
+
+        pan = executor.commanded[config.ID_PAN] + config.PAN_DIR * u_pan
+        tilt = executor.commanded[config.ID_TILT] + config.TILT_DIR * u_tilt
+        pan = max(config.PAN_RANGE[0], min(config.PAN_RANGE[1], pan))
+        tilt = max(config.TILT_RANGE[0], min(config.TILT_RANGE[1], tilt))
+
+        if executor.stream({config.ID_PAN: pan, config.ID_TILT: tilt}, self.dt):
+            if fresh: self._record_latency(time.monotonic() - frame_time)
+
+    def _search(self, executor):
+        """目标长时间丢失: 以 START_POSE 为中心做 Lissajous 扫视"""
+        self.stats["mode"] = "search"
+        pan_center = config.START_POSE[config.ID_PAN]
+        tilt_center = config.START_POSE[config.ID_TILT] + config.SEARCH_TILT_OFFSET
+        if self._search_phase is None:
+            # 先平滑移动到扫视起点，到位后再开始流式扫视
+            self._search_phase = 0.0
+            self._reset()
+            executor.move({config.ID_PAN: pan_center, config.ID_TILT: tilt_center})
+            return
+        self._search_phase += config.SEARCH_SPEED * self.dt # SEARCH_SPEED: 弧度/秒
+        phase = self._search_phase
+        executor.stream({
+            config.ID_PAN: pan_center + config.SEARCH_AMP_PAN * math.sin(phase),
+            config.ID_TILT: tilt_center + config.SEARCH_AMP_TILT * math.sin(2 * phase),
+        }, self.dt)
+
+    def _reset(self):
+        self.pid_pan.reset()
+        self.pid_tilt.reset()
+        self._det_time = None
+        self._ignore_before = time.monotonic()
+
+    def _record_latency(self, latency):
+        ms = latency * 1000.0
+        avg = self.stats["latency_avg_ms"]
+        self.stats["latency_ms"] = round(ms, 1)
+        self.stats["latency_avg_ms"] = round(ms if avg is None else 0.9 * avg + 0.1 * ms, 1)
+        self.stats["latency_max_ms"] = round(max(ms, self.stats["latency_max_ms"] or 0.0), 1)
@@ -0,0 +1,136 @@
+import binascii
+from collections import deque
+import numpy as np
+import config
+from subsystems.vad import SpeechDetector
+
+class UplinkEncoder:
+    """
+    上行音频打包: float32 (-1~1) -> int16 -> base64 -> input_audio_buffer.append
+    - int16 / float32 暂存区预分配，只在一次打包的样本数变多时扩容
+    - JSON 外壳预先写进一个复用的 bytearray，每包只把 base64 填进中间、按实际长度截出来，不再 json.dumps / 字符串拼接
+    - 一次可以打包多块 (发送端被背压时合并成一条消息)
+    """
+    PREFIX = b'{"type":"input_audio_buffer.append","audio":"'
+    SUFFIX = b'"}'
+
+    def __init__(self, capacity=4096):
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self._scaled = np.empty(capacity, dtype=np.float32)
+        self._pcm = np.empty(capacity, dtype=np.int16)
+        # [PREFIX | base64 (最多 4 * ceil(2 * capacity / 3) 字节) | SUFFIX]
+        self._frame = bytearray(len(self.PREFIX) + 4 * -(-2 * capacity // 3) + len(self.SUFFIX))
+        self._frame[:len(self.PREFIX)] = self.PREFIX
+        self._view = memoryview(self._frame)
+
+    def encode(self, chunks):
+        """chunks: 若干块 float32 样本 (API 采样率)，返回一条 JSON 文本消息"""
+        total = sum(len(c) for c in chunks)
+        if total > len(self._pcm): self._allocate(max(total, 2 * len(self._pcm)))
+        scaled = self._scaled[:total]
+        offset = 0
+        for chunk in chunks:
+            np.multiply(chunk, 32767.0, out=scaled[offset:offset + len(chunk)])
+            offset += len(chunk)
+        np.clip(scaled, -32768.0, 32767.0, out=scaled)
+        pcm = self._pcm[:total]
+        np.copyto(pcm, scaled, casting="unsafe")
+        # 服务端只收文本帧 (websockets 发 bytes 会变成二进制帧)，所以最后仍要 decode 成一个 str
+        start = len(self.PREFIX)
+        end = start + 4 * -(-2 * total // 3)
+        self._view[start:end] = binascii.b2a_base64(pcm.data, newline=False)
+        self._view[end:end + len(self.SUFFIX)] = self.SUFFIX
+        return str(self._view[:end + len(self.SUFFIX)], "ascii")
+
+
+class UplinkGate:
+    """
+    上行的客户端 VAD 门控: 房间安静时不往云端送音频
+    - 检测到语音时先补上 UPLINK_PRE_ROLL 的缓存，开头不被吃掉
+    - 语音结束后继续发送 UPLINK_HANGOVER 秒，让服务端 VAD 也能看到这段静音、判定说话结束
+    - speech_run: 截至最新一块末尾、按 20ms 子帧计的连续语音时长，本地打断用它滤掉咳嗽、敲击这类短促声音
+    """
+    def __init__(self, rate, chunk_seconds=0.06):
+        # 只用能量 + 底噪 (Silero 只支持 16k，上行是 24k)；真正的断句交给服务端 VAD
+        self.detector = SpeechDetector(sample_rate=rate, use_model=False)
+        self.rate = rate
+        self.chunk_seconds = chunk_seconds
+        self.frame = max(1, int(rate * 0.02)) # 子帧长度 (样本)，块是 60ms，只按块计时分辨率太粗
+        self.pre_roll = deque(maxlen=max(1, int(round(config.UPLINK_PRE_ROLL / chunk_seconds))))
+        self.hangover = 0.0 # 剩余的保持时间 (秒)
+        self.speech_run = 0.0 # 连续语音时长 (秒)
+        self.gated = 0 # 被拦下没发的块数
+
+    def push(self, samples, echo=False, echo_level=0.0):
+        """
+        送入一块，返回此刻应该发送的块列表 (可能为空，语音开始时包含 pre-roll)
+        echo: 这块已被回声抑制置零，按非语音处理，也不拿去更新底噪
+        echo_level: 播放期间的双讲门限 (RMS)，子帧须同时高于它才算语音 (双讲块里残留的回声不算)
+        """
+        speech = not echo and self.detector.is_speech(samples)
+        self._update_run(samples, speech, echo_level)
+        if speech:
+            self.hangover = config.UPLINK_HANGOVER
+            out = list(self.pre_roll) + [samples]
+            self.pre_roll.clear()
+            return out
+        if self.hangover > 0:
+            self.hangover -= self.chunk_seconds
+            return [samples]
+        if len(self.pre_roll) == self.pre_roll.maxlen: self.gated += 1
+        self.pre_roll.append(samples)
+        return []
+
+    def _update_run(self, samples, speech, echo_level):
+        """按子帧能量更新 speech_run: 整块判为语音时，从块尾往前数连续高于底噪 (和双讲门限) 的子帧"""
+        if not speech:
+            self.speech_run = 0.0
+            return
+        n = len(samples) // self.frame
+        if n == 0: return
+        rms = np.sqrt(np.mean(samples[:n * self.frame].reshape(n, self.frame) ** 2, axis=1))
+        quiet = np.flatnonzero(rms <= max(self.detector.noise_floor * config.VAD_SNR, echo_level))
+        if len(quiet): self.speech_run = int(n - 1 - quiet[-1]) * self.frame / self.rate
+        else: self.speech_run += len(samples) / self.rate
+
+    def reset(self):
+        """新一轮对话开始: 丢掉上一轮的缓存和保持时间"""
+        self.pre_roll.clear()
+        self.hangover = 0.0
+        self.speech_run = 0.0
+
+    @property
+    def open(self):
+        return self.hangover > 0
+
+
+class EchoSuppressor:
+    """
+    用播放参考信号做回声抑制 (能量比较，不是自适应滤波的回声消除)
+    - 参考: JitterBuffer 记录的最近 ECHO_TAIL 秒实际送给声卡的音频能量
+    - 耦合系数 (麦克风能量 / 参考能量) 只在纯回声时跟踪: 变小快跟，变大慢跟
+    - 播放期间麦克风能量不超过 "参考 × 耦合 × ECHO_MARGIN" 判为纯回声，整块置零；超过就是用户插话，原样放行
+    """
+    def __init__(self, player, chunk_seconds=0.06):
+        self.player = player
+        self.chunk_seconds = chunk_seconds
+        self.coupling = 1.0 # 初值偏大，第一次播放时快速往下收敛
+        self.level = 0.0 # 最近一块的双讲门限 (RMS): 估计回声 × ECHO_MARGIN，没在播放时为 0
+        self.suppressed = 0
+
+    def process(self, samples, capture_time):
+        """原地处理一块麦克风样本 (float32)，返回 True 表示判为纯回声 (已置零)"""
+        self.level = 0.0
+        if capture_time is None: return False
+        ref = self.player.reference_level(capture_time - self.chunk_seconds - config.ECHO_TAIL, capture_time)
+        if ref < config.ECHO_REF_FLOOR: return False
+        self.level = ref * self.coupling * config.ECHO_MARGIN
+        ratio = float(np.sqrt(np.mean(samples ** 2))) / ref
+        if ratio > self.coupling * config.ECHO_MARGIN: return False # 双讲
+        rate = 0.3 if ratio < self.coupling else config.ECHO_ADAPT
+        self.coupling += rate * (ratio - self.coupling)
+        samples[:] = 0.0
+        self.suppressed += 1
+        return True
@@ -0,0 +1,118 @@
+import os
+from collections import deque
+import numpy as np
+import config
+
+try:
+    import sherpa_onnx
+    SHERPA_AVAILABLE = True
+except ImportError:
+    SHERPA_AVAILABLE = False
+
+class SpeechDetector:
+    """
+    逐块判断是否有人声 (16kHz float32)
+    - 有 Silero 模型时用神经网络 VAD (sherpa-onnx)，风扇 / 电视底噪不会被当成说话
+    - 底噪 (RMS) 持续跟踪: 非语音块上慢慢更新，语音能量须高于底噪 VAD_SNR 倍
+    - 没有模型时只用能量 + 底噪判断
+    """
+    def __init__(self, sample_rate=16000, initial_floor=0.02, use_model=True):
+        self.sample_rate = sample_rate
+        self.noise_floor = initial_floor
+        self.vad = self._create_vad(config.VAD_MODEL) if use_model else None
+
+    def _create_vad(self, model):
+        if not SHERPA_AVAILABLE or not os.path.exists(model):
+            print(f"⚠️ Silero VAD 不可用 ({model})，使用能量门限")
+            return None
+        try:
+            cfg = sherpa_onnx.VadModelConfig()
+            cfg.silero_vad.model = model
+            cfg.silero_vad.threshold = config.VAD_THRESHOLD
+            # 断句的静音保持由 SpeechSegmenter 负责，这里尽量灵敏
+            cfg.silero_vad.min_silence_duration = 0.1
+            cfg.silero_vad.min_speech_duration = 0.1
+            cfg.sample_rate = self.sample_rate
+            cfg.num_threads = 1
+            return sherpa_onnx.VoiceActivityDetector(cfg, buffer_size_in_seconds=10)
+        except Exception as e:
+            print(f"⚠️ Silero VAD 启动失败: {e}，使用能量门限")
+            return None
+
+    def is_speech(self, samples):
+        rms = float(np.sqrt(np.mean(samples ** 2))) if len(samples) else 0.0
+        loud = rms > self.noise_floor * config.VAD_SNR
+
+        if self.vad is not None:
+            self.vad.accept_waveform(samples)
+            speech = self.vad.is_speech_detected() and loud
+            while not self.vad.empty(): self.vad.pop() # 只用实时状态，不攒片段
+        else:
+            speech = loud
+
+        if not speech:
+            # 底噪: 变安静时快速跟上，变吵时慢慢跟上 (避免被说话声拉高)
+            rate = 0.3 if rms < self.noise_floor else config.VAD_FLOOR_ADAPT
+            self.noise_floor += rate * (rms - self.noise_floor)
+            self.noise_floor = max(self.noise_floor, 1e-4)
+        return speech
+
+    def reset(self):
+        if self.vad is not None: self.vad.reset()
+
+
+class SpeechSegmenter:
+    """
+    把连续音频切成语音片段: 前置缓冲 (pre-roll) + 语音 + 结尾静音保持 (hangover)
+    push() 每次送入一块，一句话结束时返回整段音频，否则返回 None
+    """
+    def __init__(self, detector, sample_rate=16000):
+        self.detector = detector
+        self.sample_rate = sample_rate
+        self.pre_roll = deque()
+        self.reset()
+
+    def reset(self):
+        self.pre_roll.clear()
+        self._pre_len = 0
+        self.frames = []
+        self.in_speech = False
+        self._total = 0 # 片段总样本数
+        self._speech_len = 0 # 片段中判为语音的样本数
+        self._silence_len = 0 # 当前连续静音的样本数
+        self.detector.reset()
+
+    def push(self, samples):
+        speech = self.detector.is_speech(samples)
+        n = len(samples)
+
+        if not self.in_speech:
+            self.pre_roll.append(samples)
+            self._pre_len += n
+            while self.pre_roll and self._pre_len - len(self.pre_roll[0]) >= config.VAD_PRE_ROLL * self.sample_rate:
+                self._pre_len -= len(self.pre_roll.popleft())
+            if speech:
+                self.in_speech = True
+                self.frames = list(self.pre_roll)
+                self._total = self._pre_len
+                self.pre_roll.clear()
+                self._pre_len = 0
+                self._speech_len = n
+                self._silence_len = 0
+            return None
+
+        self.frames.append(samples)
+        self._total += n
+        if speech:
+            self._speech_len += n
+            self._silence_len = 0
+        else:
+            self._silence_len += n
+
+        if self._silence_len >= config.VAD_HANGOVER * self.sample_rate or self._total >= config.ASR_MAX_UTTERANCE * self.sample_rate:
+            segment = np.concatenate(self.frames)
+            long_enough = self._speech_len >= config.VAD_MIN_SPEECH * self.sample_rate
+            self.frames = []
+            self.in_speech = False
+            return segment if long_enough else None
+        return None
@@ -1,8 +1,17 @@
 import cv2
 import numpy as np
-import os
 import time
 import threading
+from collections import namedtuple
+import config
+from subsystems.detectors import DETECTION_DTYPE, create_detector
+from subsystems.frame_ring import FrameRing
+from subsystems.multi_tracker import MultiObjectTracker
+from subsystems.motion_gate import MotionGate, crop_region
+
+# 推理线程发布的结果 (整体替换，读取方无需加锁)
+# offset: 最大人形相对画面中心的归一化偏移或 None; frame_time: 画面采集时刻 (time.monotonic)
+DetectionResult = namedtuple("DetectionResult", ["offset", "detections", "frame_time", "frame_seq", "infer_ms", "target_id"])
 
 class VisionSystem:
     def __init__(self):
@@ -10,118 +19,201 @@ class VisionSystem:
         self.cap = cv2.VideoCapture(0)
         
         # 恢复标准分辨率，防止模型崩溃
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, config.FRAME_WIDTH)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config.FRAME_HEIGHT)
         self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
         
-        model_path = "/home/scottwang/lelamp_v2/models/yolov8n.onnx"
-        self.net = None
-        if os.path.exists(model_path):
-            try:
-                self.net = cv2.dnn.readNetFromONNX(model_path)
-                self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-                self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
-                print("✅ YOLOv8 加载成功")
-            except: pass
-        else:
-            print("⚠️ 未找到 YOLO 模型")
+        # 检测后端由 config 决定 (OpenCV DNN / ONNX Runtime、输入尺寸、量化模型)
+        self.detector = create_detector()
+        # 检测之上的多目标跟踪: 稳定 ID + 两次检测之间的卡尔曼预测
+        self.tracker = MultiObjectTracker()
+        self.frame_size = (config.FRAME_WIDTH, config.FRAME_HEIGHT)
+        # 运动门控: 画面静止且没有目标时不跑 YOLO
+        self.gate = MotionGate() if config.VISION_MOTION_GATE else None
+        self.motion_regions = [] # 最近一帧的运动区域 (x, y, w, h)
 
-        self.current_frame = None
-        self.frame_lock = threading.Lock()
+        # 预分配的帧环形缓冲区: 采集线程直接写入，消费者租用只读视图
+        self.ring = FrameRing(config.VISION_RING_SIZE, (config.FRAME_HEIGHT, config.FRAME_WIDTH, 3))
         self.running = True
+
+        self.latest_result = None
+        self.last_detections = np.empty(0, dtype=DETECTION_DTYPE)
+        self.infer_ms = None # 推理耗时 (指数平均)
+        self.infer_interval = 1.0 / config.VISION_MAX_FPS
+        self.stats = {"gated": 0, "cropped": 0, "full": 0} # 跳过 / 裁剪检测 / 整幅检测 的帧数
         
         threading.Thread(target=self._update_loop, daemon=True).start()
+        if self.detector is not None:
+            threading.Thread(target=self._inference_loop, daemon=True).start()
 
-        self.last_offset = None
-        self.frame_count = 0
+    @property
+    def frame_seq(self):
+        return self.ring.seq
+
+    @property
+    def frame_time(self):
+        """最新一帧的采集时刻 (time.monotonic)"""
+        return self.ring.latest_time()
 
     def _update_loop(self):
+        ring = self.ring
         while self.running:
             if self.cap.isOpened():
-                ret, frame = self.cap.read()
+                slot = ring.acquire_write_slot()
+                if slot is None:
+                    # 所有槽位都被租用 (消费者太慢)，读出并丢弃这一帧
+                    self.cap.grab()
+                    time.sleep(0.01)
+                    continue
+                buf = ring.buffer(slot)
+                ret, frame = self.cap.read(buf)
                 if ret:
-                    with self.frame_lock:
-                        self.current_frame = frame
+                    if not np.shares_memory(frame, buf):
+                        # 后端没有写进预分配内存 (或分辨率与预设不同)
+                        if frame.shape != ring.shape:
+                            ring.reshape(frame.shape, frame.dtype)
+                            slot = ring.acquire_write_slot()
+                            if slot is None: continue
+                            buf = ring.buffer(slot)
+                        np.copyto(buf, frame)
+                    ring.commit(slot, time.monotonic())
                 else:
                     time.sleep(0.1)
             time.sleep(0.01)
 
+    def _inference_loop(self):
+        """
+        专用推理线程: 总是处理最新一帧，来不及处理的旧帧直接丢弃
+        推理频率根据实测耗时自适应，CPU 占用不超过 VISION_MAX_DUTY
+        """
+        last_seq = 0
+        last_full = 0.0 # 上次整幅画面检测的采集时刻
+        while self.running:
+            lease = self.ring.acquire_latest(after_seq=last_seq, timeout=1.0)
+            if lease is None: continue
+            frame_time = lease.timestamp
+            last_seq = lease.seq
+
+            # 推理期间持有租约，采集线程不会覆盖这一帧 (无需拷贝)
+            start = time.monotonic()
+            skip, crop = False, None
+            try:
+                with lease:
+                    if self.gate is not None:
+                        regions = self.gate.update(lease.frame)
+                        self.motion_regions = regions
+                        tracks = self.tracker.predict(frame_time)
+                        # 定期整幅检测一次，找回静止不动 (已并入背景) 的人
+                        refresh = frame_time - last_full >= config.VISION_IDLE_DETECT_INTERVAL
+                        if not regions and not tracks and not refresh:
+                            skip = True
+                        elif not refresh:
+                            crop = crop_region(regions + [track["box"] for track in tracks], lease.frame.shape,
+                                               config.MOTION_CROP_PAD, config.MOTION_CROP_MAX_AREA)
+                    if not skip:
+                        offset, detections = self._infer(lease.frame, frame_time, crop)
+            except Exception as e:
+                print(f"⚠️ 推理失败: {e}")
+                time.sleep(0.5)
+                continue
+
+            if skip:
+                # 画面静止: 只跑门控 (缩小图差分)，频率 VISION_GATE_FPS
+                self.stats["gated"] += 1
+                delay = start + 1.0 / config.VISION_GATE_FPS - time.monotonic()
+                if delay > 0: time.sleep(delay)
+                continue
+            if crop is None:
+                last_full = frame_time
+                self.stats["full"] += 1
+            else:
+                self.stats["cropped"] += 1
+            cost = time.monotonic() - start
+
+            self.infer_ms = cost * 1000 if self.infer_ms is None else 0.8 * self.infer_ms + 0.2 * cost * 1000
+            target_id = self.tracker.target_id
+            self.latest_result = DetectionResult(offset, detections, frame_time, last_seq, cost * 1000, target_id)
+            self.last_detections = detections
+
+            # 自适应频率: 两次推理之间留出空闲，保证语音和控制线程有 CPU
+            self.infer_interval = max(1.0 / config.VISION_MAX_FPS, self.infer_ms / 1000 / config.VISION_MAX_DUTY)
+            if target_id is not None:
+                # 主目标跟踪稳定时降低检测频率，中间帧由卡尔曼预测补上
+                self.infer_interval = max(self.infer_interval, 1.0 / config.VISION_TRACKED_FPS)
+            delay = start + self.infer_interval - time.monotonic()
+            if delay > 0: time.sleep(delay)
+
     def get_raw_frame(self):
-        with self.frame_lock:
-            if self.current_frame is not None:
-                return self.current_frame.copy()
-        return None
-
-    def get_latest_jpeg(self):
-        frame = self.get_raw_frame()
-        if frame is not None:
-            _, buf = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 60])
-            return buf.tobytes()
-        return None
+        """最新一帧的独立拷贝 (需要长期保存或修改画面时用)"""
+        lease = self.ring.acquire_latest(timeout=0)
+        if lease is None: return None
+        with lease:
+            return lease.frame.copy()
+
+    def lease_latest_frame(self, after_seq=0, timeout=None):
+        """租用最新一帧的只读视图 (不拷贝)，用完必须 release()"""
+        return self.ring.acquire_latest(after_seq, timeout)
+
+    def get_detections(self):
+        """最近一次推理得到的全部人形检测框 (DETECTION_DTYPE)"""
+        return self.last_detections
+
+    def get_latest_result(self):
+        """最近一次推理结果 (DetectionResult)，不阻塞、不触发推理"""
+        return self.latest_result
 
     def get_face_offset(self):
-        if self.net is None: return None
-        
-        frame = self.get_raw_frame()
-        if frame is None: return None
+        """主目标此刻的偏移 (卡尔曼外推到当前时刻，不是上一次检测的旧值)，没有目标返回 None"""
+        prediction = self.tracker.predict_target(time.monotonic())
+        if prediction is None: return None
+        return self._to_offset(*prediction[0])
+
+    def get_motion_regions(self):
+        """最近一帧的运动区域 [(x, y, w, h), ...]，画面静止时为空"""
+        return self.motion_regions
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["infer_ms"] = None if self.infer_ms is None else round(self.infer_ms, 1)
+        stats["infer_interval_ms"] = round(self.infer_interval * 1000, 1)
+        stats["motion_ratio"] = round(self.gate.motion_ratio, 4) if self.gate else None
+        return stats
+
+    def get_tracks(self):
+        """所有已确认目标此刻的预测 [{id, box, velocity, age}, ...]"""
+        return self.tracker.predict(time.monotonic())
 
-        self.frame_count += 1
-        if self.frame_count % 5 != 0:
-            return self.last_offset 
+    def _to_offset(self, tx, ty):
+        w, h = self.frame_size
+        offset_x = (w/2 - tx) / (w/2)
+        offset_y = (h/2 - ty) / (h/2)
 
+        if abs(offset_x) < 0.1: offset_x = 0
+        if abs(offset_y) < 0.1: offset_y = 0
+        return (offset_x, offset_y)
+
+    def _infer(self, frame, frame_time, crop=None):
+        """
+        对一帧做 YOLO 推理并更新跟踪器，返回 (主目标的偏移或 None, 全部检测框)
+        crop: (x0, y0, x1, y1) 时只检测该区域 (运动区域 + 跟踪目标)，坐标换算回原图
+        """
         h, w = frame.shape[:2]
-        
-        # 🔥 核心修复：改回 (640, 640) 以匹配标准模型
-        blob = cv2.dnn.blobFromImage(frame, 1/255.0, (640, 640), swapRB=True, crop=False)
-        self.net.setInput(blob)
-        outputs = self.net.forward()
-        
-        outputs = np.array([cv2.transpose(outputs[0])])
-        rows = outputs.shape[1]
-        
-        boxes = []
-        scores = []
-        
-        x_factor = w / 640
-        y_factor = h / 640
-
-        for i in range(rows):
-            classes_scores = outputs[0][i][4:]
-            (minScore, maxScore, minClassLoc, (class_id, _)) = cv2.minMaxLoc(classes_scores)
-            
-            if maxScore >= 0.4 and class_id == 0:
-                row = outputs[0][i]
-                x_center, y_center, width, height = row[0], row[1], row[2], row[3]
-                left = int((x_center - width * 0.5) * x_factor)
-                top = int((y_center - height * 0.5) * y_factor)
-                boxes.append([left, top, int(width*x_factor), int(height*y_factor)])
-                scores.append(maxScore)
-
-        indices = cv2.dnn.NMSBoxes(boxes, scores, 0.4, 0.45)
-        
-        target_center = None
-        if len(indices) > 0:
-            max_area = 0
-            for i in indices.flatten():
-                x, y, w_box, h_box = boxes[i]
-                if (w_box * h_box) > max_area:
-                    max_area = w_box * h_box
-                    target_center = (x + w_box/2, y + h_box/2)
-        
-        if target_center:
-            tx, ty = target_center
-            offset_x = (w/2 - tx) / (w/2)
-            offset_y = (h/2 - ty) / (h/2)
-            
-            if abs(offset_x) < 0.1: offset_x = 0
-            if abs(offset_y) < 0.1: offset_y = 0
-            
-            self.last_offset = (offset_x, offset_y)
-            return (offset_x, offset_y)
-        
-        self.last_offset = None
-        return None
+        self.frame_size = (w, h)
+        if crop is None:
+            detections = self.detector.detect(frame)
+        else:
+            x0, y0, x1, y1 = crop
+            detections = self.detector.detect(frame[y0:y1, x0:x1])
+            detections["x"] += x0
+            detections["y"] += y0
+
+        # 主目标: 锁定的轨迹 (滤波后的框)，丢失后换成面积最大的人
+        if self.tracker.update(detections, frame_time) is None:
+            return None, detections
+        (cx, cy), _ = self.tracker.predict_target(frame_time) # 滤波后的框，换回画面坐标
+        return self._to_offset(cx, cy), detections
 
     def release(self):
         self.running = False
+        self.ring.wake_all()
         self.cap.release()
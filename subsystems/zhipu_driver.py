@@ -6,32 +6,60 @@ import time
 import json
 import base64
 import threading
-import queue
 import numpy as np
+from collections import deque
 import config
-
-try:
-    from scipy.signal import resample
-    SCIPY_AVAILABLE = True
-except ImportError:
-    SCIPY_AVAILABLE = False
-    print("⚠️ Scipy 未安装，使用简易降采样")
+from subsystems.mic import MicCapture
+from subsystems.resampler import StreamingResampler
+from subsystems.playback import JitterBuffer
+from subsystems.uplink import UplinkEncoder, UplinkGate, EchoSuppressor
 
 # GLM-4-Voice 配置
 URL = "wss://open.bigmodel.cn/api/paas/v4/realtime"
+INSTRUCTIONS = "你是Friday。请用中文简短回答。"
 
 class ZhipuRealtimeClient:
-    def __init__(self, action_engine=None):
+    """
+    常驻的实时对话客户端
+    - start() 开机时调用一次: 打开扬声器、建立 websocket、发送 session.update，之后一直保持连接 (待机时定时 ping)
+    - 唤醒后 activate() 开始一轮对话 (只是开始上传麦克风)，deactivate() 结束；断线在后台自动重连
+    - idle_for() 给出双方都没出声的时长，由调用方按 REALTIME_IDLE_TIMEOUT 结束对话
+    """
+    def __init__(self, action_engine=None, mic=None):
         print("🚀 初始化 GLM-4-Voice (V45 协议修正版)...")
         self.api_key = config.ZHIPU_API_KEY
         self.action_engine = action_engine 
         self.running = False
         
-        # 队列
-        self.mic_queue = queue.Queue(maxsize=200) 
-        self.spk_queue = queue.Queue(maxsize=200)
+        # 网络协程跑在自己的事件循环里；录音线程通过 call_soon_threadsafe 把数据交给它
+        self.loop = None
+        self.ws = None
+        self.mic_queue = None # asyncio.Queue，只在事件循环线程里访问
+        
+        # 会话状态
+        self.active = threading.Event() # 正在对话 (上传麦克风)
+        self.connected = threading.Event()
+        self.last_activity = time.monotonic() # 最近一次有人出声 (用户说话 / 云端回复)
+        self._token = None
+        self._token_exp = 0
+        self.session_stats = {"connects": 0, "connect_ms": None, "response_ms": None}
+        self._speech_stopped_at = None
+        self._user_speaking = False # 服务端 VAD 判定用户正在说话
+        
+        # 打断: 正在生成的回复 id、已取消的回复 id (之后到达的这些回复的音频直接丢弃)
+        self.response_id = None
+        self.responding = False
+        self.cancelled = deque(maxlen=16)
+        self._drop_untagged = False # 取消时还不知道回复 id: 丢弃不带 id 的音频，直到下一条回复开始
+        self._last_delta = 0.0
+        self._last_interrupt = 0.0
+        self.barge_in = deque(maxlen=50) # 每次打断的延迟 (秒)
+        self.barge_in_stats = {"barge_ins": 0, "cancelled_deltas": 0, "speaker_reopens": 0}
+        self._speaker_lock = threading.Lock()
         
-        self.p = pyaudio.PyAudio()
+        # 麦克风由常驻采集服务提供 (设备不再重复打开)，扬声器共用同一个 PyAudio
+        self.mic = mic or MicCapture()
+        self.p = self.mic.p
         self._find_devices()
         
         # 🔥 严格的帧长对齐 (关键!)
@@ -40,116 +68,283 @@ class ZhipuRealtimeClient:
         self.API_RATE = 24000
         self.API_CHUNK = 1440 
         
-        # 硬件: 48000Hz
+        # 扬声器: 48000Hz (麦克风走常驻采集，按它的实际采样率)
         self.HW_RATE = 48000
-        self.HW_CHUNK = 2880 # 60ms @ 48k (正好是 API_CHUNK 的 2 倍)
+        self.MIC_CHUNK = int(self.mic.rate * 0.06) # 60ms @ 麦克风实际采样率
+        self.SPK_CHUNK = 960 # 扬声器回调每次 20ms
+
+        # 播放侧抖动缓冲: 网络线程写入，声卡回调按硬件节奏读取
+        self.player = JitterBuffer(self.HW_RATE)
+        self.output_stream = None
+        self.mic_reader = None
+        self.mic_drops = 0 # 发送跟不上、mic_queue 满了丢掉的块
+
+        # 上行: 预分配的打包器 + 客户端 VAD 门控
+        self.encoder = UplinkEncoder(self.API_CHUNK * config.UPLINK_MAX_BATCH)
+        self.gate = UplinkGate(self.API_RATE) if config.UPLINK_VAD else None
+        self.echo = EchoSuppressor(self.player) if config.ECHO_SUPPRESS else None
+        self.uplink_stats = {"messages": 0, "chunks": 0, "batched": 0}
+        self.uplink_latency = deque(maxlen=200) # 每块 "采集 -> 发出" 的延迟 (秒)
+
+        # 流式多相重采样 (带抗混叠滤波，块与块之间连续)
+        self.uplink_resampler = StreamingResampler(self.mic.rate, self.API_RATE)
+        self.downlink_resampler = StreamingResampler(self.API_RATE, self.HW_RATE)
         
         self.MIC_GAIN = 10.0 
 
     def _find_devices(self):
-        self.input_index = None
         self.output_index = None
         for i in range(self.p.get_device_count()):
             info = self.p.get_device_info_by_index(i)
             name = info.get('name', '')
-            if info.get('maxInputChannels') > 0:
-                if ('USB' in name or 'ReSpeaker' in name) and 'Webcam' not in name:
-                    self.input_index = i
             if info.get('maxOutputChannels') > 0:
                 if 'Headphones' in name or 'bcm2835' in name:
                     self.output_index = i
         
-        if self.input_index is None: self.input_index = 2
         if self.output_index is None: self.output_index = 0
-        print(f"✅ [Mic] ID:{self.input_index} | [Speaker] ID:{self.output_index}")
+        print(f"✅ [Mic] ID:{self.mic.device_index} @ {self.mic.rate}Hz | [Speaker] ID:{self.output_index}")
 
     def _generate_token(self):
+        # 缓存 JWT，快过期才重新签发 (重连时不用每次都签)
+        now = int(time.time())
+        if self._token and self._token_exp - now > config.REALTIME_TOKEN_REFRESH: return self._token
         try:
             id, secret = self.api_key.split(".")
-            payload = { "api_key": id, "exp": int(time.time()) + 3600, "timestamp": int(time.time()) } # 延长有效期
-            return jwt.encode(payload, secret.encode("utf-8"), algorithm="HS256", headers={"alg": "HS256", "sign_type": "SIGN"})
+            payload = { "api_key": id, "exp": now + config.REALTIME_TOKEN_TTL, "timestamp": now }
+            self._token = jwt.encode(payload, secret.encode("utf-8"), algorithm="HS256", headers={"alg": "HS256", "sign_type": "SIGN"})
+            self._token_exp = now + config.REALTIME_TOKEN_TTL
+            return self._token
         except: return ""
 
     # ---------------------------------------------------------
     # 🔩 硬件层 (永不停止)
     # ---------------------------------------------------------
-    def _hardware_loop(self):
-        input_stream = None
-        output_stream = None
+    def _capture_loop(self):
+        """录音: 对话期间从常驻麦克风按 60ms 一块读出，交给发送协程；待机时不读"""
+        while self.running:
+            if not self.active.wait(timeout=0.5): continue
+            # 每轮对话一个新读者，往回补一点录音，唤醒后紧接着说的话不丢
+            reader = self.mic_reader = self.mic.subscribe(pre_roll=config.MIC_SESSION_PREROLL)
+            try:
+                while self.running and self.active.is_set():
+                    samples = reader.read(self.MIC_CHUNK, timeout=0.5)
+                    if samples is None:
+                        if self.running: print("⚠️ 麦克风无数据")
+                        continue
+                    # 交给事件循环，发送协程立刻被唤醒 (不再轮询)
+                    self.loop.call_soon_threadsafe(self._enqueue_mic, samples, reader.last_time)
+            except RuntimeError: return # 事件循环已关闭
+            except Exception as e:
+                print(f"❌ 录音错误: {e}")
+                time.sleep(0.5)
+            finally:
+                reader.close()
+
+    def _enqueue_mic(self, samples, capture_time):
+        # 在事件循环线程里执行；队列满 (发送跟不上) 时丢最旧的
+        if not self.active.is_set(): return
+        if self.mic_queue.full():
+            self.mic_queue.get_nowait()
+            self.mic_drops += 1
+        self.mic_queue.put_nowait((samples, capture_time))
+
+    def _playback_callback(self, in_data, frame_count, time_info, status):
+        """扬声器回调 (声卡线程): 从抖动缓冲取音频，缓冲中或播空时输出静音"""
+        if status & pyaudio.paOutputUnderflow: self.player.device_underflows += 1
+        return (self.player.read(frame_count), pyaudio.paContinue if self.running else pyaudio.paComplete)
+
+    def _open_speaker(self):
         try:
-            input_stream = self.p.open(format=pyaudio.paFloat32, channels=1, rate=self.HW_RATE, input=True, input_device_index=self.input_index, frames_per_buffer=self.HW_CHUNK)
-            output_stream = self.p.open(format=pyaudio.paInt16, channels=1, rate=self.HW_RATE, output=True, output_device_index=self.output_index, frames_per_buffer=self.HW_CHUNK)
+            self.output_stream = self.p.open(format=pyaudio.paInt16, channels=1, rate=self.HW_RATE, output=True,
+                                             output_device_index=self.output_index, frames_per_buffer=self.SPK_CHUNK,
+                                             stream_callback=self._playback_callback)
+            self.output_stream.start_stream()
             print("✅ 硬件层就绪")
+        except Exception as e:
+            print(f"❌ 扬声器打开失败: {e}")
+            self.output_stream = None
 
-            while self.running:
-                # A. 录音
-                try:
-                    data = input_stream.read(self.HW_CHUNK, exception_on_overflow=False)
-                    samples = np.frombuffer(data, dtype=np.float32)
-                    
-                    # 简单静音门限 (Noise Gate)
-                    # if np.mean(np.abs(samples)) < 0.01:
-                    #     samples = np.zeros_like(samples)
-                    
-                    if self.mic_queue.full(): self.mic_queue.get_nowait()
-                    self.mic_queue.put(samples)
-                except: pass
+    def _flush_speaker(self):
+        """打断时丢掉声卡里还没播的音频: 输出缓冲较深时在后台重开扬声器 (关闭会直接丢弃待播缓冲)"""
+        stream = self.output_stream
+        if stream is None: return 0.0
+        try: latency = stream.get_output_latency()
+        except Exception: latency = 0.0
+        if latency <= config.BARGE_IN_REOPEN_LATENCY: return latency # 缓冲很浅，抖动缓冲清空后很快就静音
+        threading.Thread(target=self._reopen_speaker, daemon=True).start()
+        return 0.0
 
-                # B. 播放
-                try:
-                    if not self.spk_queue.empty():
-                        pcm_data = self.spk_queue.get_nowait()
-                        output_stream.write(pcm_data)
-                    else:
-                        time.sleep(0.005)
-                except: pass
+    def _reopen_speaker(self):
+        with self._speaker_lock:
+            stream, self.output_stream = self.output_stream, None
+            if stream:
+                # 不先 stop_stream (那会等缓冲播完)，直接关闭
+                try: stream.close()
+                except Exception as e: print(f"⚠️ 扬声器关闭异常: {e}")
+            if self.running: self._open_speaker()
+            self.barge_in_stats["speaker_reopens"] += 1
 
-        except Exception as e:
-            print(f"❌ 硬件错误: {e}")
-        finally:
-            if input_stream: input_stream.stop_stream(); input_stream.close()
-            if output_stream: output_stream.stop_stream(); output_stream.close()
+    def _close_speaker(self):
+        stream, self.output_stream = self.output_stream, None
+        if stream:
+            try: stream.stop_stream(); stream.close()
+            except Exception as e: print(f"⚠️ 扬声器关闭异常: {e}")
+
+    # ---------------------------------------------------------
+    # 🎙️ 会话控制 (主线程调用)
+    # ---------------------------------------------------------
+    def activate(self):
+        """唤醒: 开始一轮对话。连接已经建好，只需开始上传麦克风"""
+        if self.active.is_set(): return
+        if not self.connected.is_set(): print("⚠️ 云端尚未连上，连上后开始上传")
+        self.last_activity = time.monotonic()
+        # 先在事件循环里清掉上一轮的残留状态，再放录音线程开始读
+        self.loop.call_soon_threadsafe(self._begin_turn)
+        self.active.set()
+
+    def deactivate(self):
+        """结束本轮对话，回到待机 (连接保持)"""
+        if not self.active.is_set(): return
+        self.active.clear()
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._end_turn)
+
+    def idle_for(self):
+        """双方都没出声的时长 (秒)；还在播放回复时算作有活动"""
+        if self.player.depth() > 0 or self._user_speaking or (self.gate and self.gate.open): self.last_activity = time.monotonic()
+        return time.monotonic() - self.last_activity
+
+    def _begin_turn(self):
+        self._user_speaking = False
+        while not self.mic_queue.empty(): self.mic_queue.get_nowait()
+        self.uplink_resampler.reset()
+        if self.gate: self.gate.reset()
+
+    def _end_turn(self):
+        while not self.mic_queue.empty(): self.mic_queue.get_nowait()
+        # 丢掉服务端还没断句的半截输入，下次唤醒从干净的状态开始
+        if self.ws is not None and self.ws.open:
+            asyncio.ensure_future(self._send_quietly({"type": "input_audio_buffer.clear"}))
+
+    async def _send_quietly(self, event):
+        try: await self.ws.send(json.dumps(event))
+        except Exception as e: print(f"⚠️ 发送失败: {e}")
+
+    def _interrupt(self, detected_at, source):
+        """
+        打断 (事件循环线程): 取消云端正在生成的回复，清空本地待播音频
+        detected_at: 用户开口的时刻 (本地检测用该块的采集时刻，服务端 VAD 用事件到达时刻)
+        """
+        now = time.monotonic()
+        # 没收到 response.done 时，超过 1 秒没有新音频也当作回复已结束
+        responding = self.response_id is not None or (self.responding and now - self._last_delta < 1.0)
+        if not (responding or self.player.recently_played()): return # 没在说话，不算打断
+        if now - self._last_interrupt < 1.0: return # 本地和服务端先后报告同一次开口
+        self._last_interrupt = now
+        if responding and self.ws is not None:
+            if self.response_id is None: self._drop_untagged = True
+            elif self.response_id in self.cancelled: return # 本地已经打断过这条回复
+            else: self.cancelled.append(self.response_id)
+            asyncio.ensure_future(self._send_quietly({"type": "response.cancel"}))
+            self.responding = False
+        self.player.clear()
+        self.downlink_resampler.reset()
+        residual = self._flush_speaker()
+        latency = time.monotonic() - detected_at + residual
+        self.barge_in.append(latency)
+        self.barge_in_stats["barge_ins"] += 1
+        print(f"\n⚡ 打断! ({source}, {latency * 1000:.0f}ms)")
+
+    def get_stats(self):
+        stats = self.player.stats()
+        stats["connected"] = self.connected.is_set()
+        stats["active"] = self.active.is_set()
+        stats.update(self.session_stats)
+        stats["mic_overruns"] = self.mic_reader.overruns if self.mic_reader else 0
+        stats["mic_drops"] = self.mic_drops
+        stats.update(self.uplink_stats)
+        latency = sorted(self.uplink_latency)
+        if latency:
+            stats["uplink_latency_ms"] = round(self.uplink_latency[-1] * 1000, 1)
+            stats["uplink_latency_avg_ms"] = round(sum(latency) / len(latency) * 1000, 1)
+            stats["uplink_latency_p95_ms"] = round(latency[int(0.95 * (len(latency) - 1))] * 1000, 1)
+        stats["gated"] = self.gate.gated if self.gate else 0
+        stats["echo_suppressed"] = self.echo.suppressed if self.echo else 0
+        if self.echo: stats["echo_coupling"] = round(self.echo.coupling, 3)
+        stats.update(self.barge_in_stats)
+        if self.barge_in:
+            stats["barge_in_ms"] = round(self.barge_in[-1] * 1000, 1)
+            stats["barge_in_max_ms"] = round(max(self.barge_in) * 1000, 1)
+        return stats
 
     # ---------------------------------------------------------
     # ☁️ 网络层
     # ---------------------------------------------------------
     async def _network_sender(self, ws):
         print("   -> 发送线程启动")
-        # 清空积压
-        while not self.mic_queue.empty(): self.mic_queue.get()
+        # 清理积压: 只保留连接建立前最近 MIC_SESSION_BACKLOG 秒的录音 (唤醒后马上说的话照样发出去)
+        keep = int(config.MIC_SESSION_BACKLOG / 0.06)
+        while self.mic_queue.qsize() > keep: self.mic_queue.get_nowait()
+        self.uplink_resampler.reset()
         
+        last_send = time.monotonic()
         while self.running and ws.open:
             try:
-                # 🔥 关键策略：如果队列有数据，发送数据；如果没有，发送静音帧保活
-                # 这比 WebSocket Ping 更管用，因为 API 期待的是音频流
-                if not self.mic_queue.empty():
-                    samples_48k = self.mic_queue.get()
-                    # 增益
-                    samples_48k = samples_48k * self.MIC_GAIN
-                    samples_48k = np.clip(samples_48k, -1.0, 1.0)
+                # 等下一块录音: 一到就发，没有轮询间隔；每 0.5 秒醒一次检查停止 / 保活
+                try:
+                    item = await asyncio.wait_for(self.mic_queue.get(), 0.5)
+                except asyncio.TimeoutError:
+                    idle = time.monotonic() - last_send
+                    if self.active.is_set():
+                        # 对话中门控期间定时发一块静音保活，防止连接因长时间无数据被断开
+                        if idle > config.UPLINK_KEEPALIVE:
+                            await ws.send(self.encoder.encode([np.zeros(self.API_CHUNK, dtype=np.float32)]))
+                            last_send = time.monotonic()
+                    elif idle > config.REALTIME_IDLE_PING:
+                        # 待机: 只 ping，不往输入缓冲里塞静音
+                        await ws.ping()
+                        last_send = time.monotonic()
+                    continue
+
+                # 发送跟不上时 (队列里积压了多块)，合并成一条消息一起发
+                batch, capture_times = [], []
+                while True:
+                    samples, capture_time = item
+                    # 回声抑制: 播放期间只有回声的块置零 (用原始电平和播放参考比较)
+                    echo = self.echo.process(samples, capture_time) if self.echo else False
+                    # 增益 (原地，samples 是读者拷贝出来的独立数组)
+                    # 这里不限幅: 打包时 int16 会饱和；先削顶会让响亮语音的能量低于按增益放大的双讲门限
+                    np.multiply(samples, self.MIC_GAIN, out=samples)
                     
-                    # 降采样 48k -> 24k
-                    if SCIPY_AVAILABLE:
-                        # 高质量重采样
-                        samples_24k = resample(samples_48k, self.API_CHUNK)
+                    # 降采样 麦克风采样率 -> 24k
+                    samples_24k = self.uplink_resampler.process(samples)
+                    if self.gate:
+                        run = self.gate.speech_run
+                        echo_level = self.echo.level * self.MIC_GAIN if self.echo else 0.0
+                        chunks = self.gate.push(samples_24k, echo=echo, echo_level=echo_level)
+                        # 连续语音刚满 BARGE_IN_MIN_SPEECH = 用户开口: 立刻打断，不等服务端 VAD 往返
+                        # (咳嗽、敲桌子、舵机声太短，不算)；打断时刻按这段语音的起点算
+                        if (config.BARGE_IN_LOCAL and capture_time is not None
+                                and run < config.BARGE_IN_MIN_SPEECH <= self.gate.speech_run):
+                            self._interrupt(capture_time - self.gate.speech_run, "本地")
                     else:
-                        # 简易降采样
-                        samples_24k = samples_48k[::2]
-
-                    # 转 Int16
-                    pcm_bytes = (samples_24k * 32767).astype(np.int16).tobytes()
-                else:
-                    # 🔥 发送静音帧保活 (60ms 的静音)
-                    await asyncio.sleep(0.06) 
-                    # 仅在长时间静默时偶尔发一个静音包防止断连? 
-                    # 不，Realtime API 通常喜欢持续的数据流。
-                    # 这里我们简单 sleep 等待硬件数据即可，因为硬件层是匀速生产的。
-                    continue
+                        chunks = [samples_24k]
+                    if chunks:
+                        batch.extend(chunks)
+                        capture_times.append(capture_time)
+                    if len(batch) >= config.UPLINK_MAX_BATCH or self.mic_queue.empty(): break
+                    item = self.mic_queue.get_nowait()
+                if not batch: continue
 
-                await ws.send(json.dumps({
-                    "type": "input_audio_buffer.append",
-                    "audio": base64.b64encode(pcm_bytes).decode("utf-8")
-                }))
+                # ws.send 会等待写缓冲排空 (背压)，这期间到达的块下一轮合并发送
+                await ws.send(self.encoder.encode(batch))
+                last_send = time.monotonic()
+                if self.gate and self.gate.open: self.last_activity = last_send
+                for capture_time in capture_times:
+                    if capture_time is not None: self.uplink_latency.append(last_send - capture_time)
+                self.uplink_stats["messages"] += 1
+                self.uplink_stats["chunks"] += len(batch)
+                if len(batch) > 1: self.uplink_stats["batched"] += 1
                 
             except Exception as e:
                 print(f"发送异常: {e}")
@@ -161,15 +356,27 @@ class ZhipuRealtimeClient:
             try:
                 msg = json.loads(message)
                 if msg["type"] == "audio.delta":
+                    # 已取消的回复还在路上的音频，直接丢弃
+                    rid = msg.get("response_id")
+                    if (rid is not None and rid in self.cancelled) or (rid is None and self._drop_untagged):
+                        self.barge_in_stats["cancelled_deltas"] += 1
+                        continue
+                    self.responding = True
+                    self._last_delta = time.monotonic()
                     print(".", end="", flush=True)
+                    self.last_activity = time.monotonic()
+                    if self._speech_stopped_at is not None:
+                        # 用户说完 -> 第一段回复音频 (模型本身的响应时间)
+                        self.session_stats["response_ms"] = round((self.last_activity - self._speech_stopped_at) * 1000)
+                        self._speech_stopped_at = None
                     audio_data = base64.b64decode(msg["delta"])
                     
                     # 升采样 24k -> 48k
                     samples_24k = np.frombuffer(audio_data, dtype=np.int16)
-                    # 线性插值升采样 (比 repeat 更平滑一点)
-                    samples_48k = np.repeat(samples_24k, 2) 
+                    samples_48k = self.downlink_resampler.process(samples_24k / 32768.0)
+                    samples_48k = np.clip(samples_48k * 32768.0, -32768, 32767).astype(np.int16)
                     
-                    self.spk_queue.put(samples_48k.tobytes())
+                    self.player.write(samples_48k)
                     
                     if self.action_engine:
                          # 简单的 RMS 计算
@@ -177,9 +384,24 @@ class ZhipuRealtimeClient:
                          if rms > 1000 and np.random.rand() < 0.1: pass
 
                 elif msg["type"] == "input_audio_buffer.speech_started":
-                    print("\n⚡ 打断!")
-                    while not self.spk_queue.empty(): self.spk_queue.get()
+                    self.last_activity = time.monotonic()
+                    self._user_speaking = True
+                    self._interrupt(self.last_activity, "服务端")
+
+                elif msg["type"] == "input_audio_buffer.speech_stopped":
+                    self.last_activity = self._speech_stopped_at = time.monotonic()
+                    self._user_speaking = False
                 
+                elif msg["type"] == "response.created":
+                    self.response_id = msg.get("response", {}).get("id")
+                    self.responding = True
+                    self._drop_untagged = False
+
+                elif msg["type"] == "response.done":
+                    if msg.get("response", {}).get("id") in (None, self.response_id):
+                        self.response_id = None
+                        self.responding = False
+
                 elif msg["type"] == "error":
                     print(f"\n⚠️ API Error: {msg}")
 
@@ -190,26 +412,33 @@ class ZhipuRealtimeClient:
         print("\n👋 连接关闭")
 
     async def _run_network_loop(self):
+        backoff = 2.0
         while self.running:
             token = self._generate_token()
             headers = { "Authorization": f"Bearer {token}" }
             
             try:
                 print("🔄 连接智谱云端...")
-                # 🔥 关键：ping_interval=None 禁用默认 ping，防止与音频流冲突
+                t0 = time.monotonic()
+                # 🔥 关键：ping_interval=None 禁用默认 ping，防止与音频流冲突 (待机时由发送协程手动 ping)
                 async with websockets.connect(URL, extra_headers=headers, ping_interval=None) as ws:
                     
-                    # 1. 建立会话
+                    # 1. 建立会话 (每条连接只发一次，之后各轮对话共用)
                     await ws.send(json.dumps({
                         "type": "session.update",
                         "session": { 
                             "voice": "Blue", 
-                            "instructions": "你是Friday。请用中文简短回答。",
+                            "instructions": INSTRUCTIONS,
                             "turn_detection": {
                                 "type": "server_vad" # 显式开启服务端 VAD
                             }
                         }
                     }))
+                    self.ws = ws
+                    self.connected.set()
+                    self.session_stats["connects"] += 1
+                    self.session_stats["connect_ms"] = round((time.monotonic() - t0) * 1000)
+                    backoff = 2.0
                     
                     # 2. 并发读写
                     await asyncio.gather(
@@ -218,13 +447,34 @@ class ZhipuRealtimeClient:
                     )
             except Exception as e:
                 print(f"⚠️ 网络异常: {e}")
-                await asyncio.sleep(2)
+            finally:
+                self.connected.clear()
+                self.ws = None
+            if self.running:
+                # 断线后在后台重连，下次唤醒时连接已经就绪
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, config.REALTIME_RECONNECT_MAX)
 
     def start(self):
+        """预热: 打开扬声器并建立常驻连接 (开机时调用一次)"""
         if self.running: return
         self.running = True
-        threading.Thread(target=self._hardware_loop, daemon=True).start()
-        threading.Thread(target=lambda: asyncio.run(self._run_network_loop()), daemon=True).start()
+        self._open_speaker()
+        self.loop = asyncio.new_event_loop()
+        self.mic_queue = asyncio.Queue(maxsize=200)
+        threading.Thread(target=self._run_loop, daemon=True).start()
+        threading.Thread(target=self._capture_loop, daemon=True).start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try: self.loop.run_until_complete(self._run_network_loop())
+        finally: self.loop.close()
 
     def stop(self):
         self.running = False
+        self.active.clear()
+        ws, loop = self.ws, self.loop
+        if ws is not None and loop and not loop.is_closed():
+            try: asyncio.run_coroutine_threadsafe(ws.close(), loop)
+            except RuntimeError: pass
+        with self._speaker_lock: self._close_speaker()